@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+from operator import itemgetter
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from decision_tree import tree_node, recursive_decision_tree, \
+    iterative_decision_tree
+
+SHAPES = ("chain", "wide", "balanced", "skewed")
+IMPLEMENTATIONS = ("recursive", "iterative", "compiled", "optimized")
+OPERATIONS = ("traversal", "get", "add", "size")
+MUTATING_OPERATIONS = ("add",)
+TRAINING_METHODS = ("out_of_core", "in_memory")
+MAX_SAMPLED_PATHS = 10000
+MAX_SAMPLED_KEYS = 4000000
+BRANCHING = 4
+FALL_OFF_RATIO = 0.05
+FALL_OFF_PATHS = 16
+
+_key_getters = []
+
+
+def _key_at(depth):
+    while len(_key_getters) <= depth:
+        _key_getters.append(itemgetter(len(_key_getters)))
+
+    return _key_getters[depth]
+
+
+def _child_count(shape, size, depth, position):
+    if shape == "chain":
+        return 1
+    if shape == "wide":
+        return size - 1 if depth == 0 else 0
+    if shape == "balanced":
+        return BRANCHING
+    if shape == "skewed":
+        return BRANCHING if position == 0 else 0
+
+    raise ValueError("unknown tree shape %r" % shape)
+
+
+def build_tree(shape, size, rng):
+    if size < 1:
+        return None, []
+
+    root = tree_node(_key_at(0))
+    queue = [root]
+    parents = array("q", [-1])
+    child_keys = array("q", [0])
+    depths = array("q", [0])
+    leaf_indexes = []
+    leaf_count = 0
+    created = 1
+    pos = 0
+
+    while pos < len(queue):
+        node = queue[pos]
+        queue[pos] = None
+        depth = depths[pos]
+        child_count = min(_child_count(shape, size, depth, child_keys[pos]),
+                          size - created)
+
+        if not child_count:
+            node.decision = "leaf"
+            leaf_count += 1
+
+            if len(leaf_indexes) < MAX_SAMPLED_PATHS:
+                leaf_indexes.append(pos)
+            else:
+                replaced = rng.randrange(leaf_count)
+
+                if replaced < MAX_SAMPLED_PATHS:
+                    leaf_indexes[replaced] = pos
+
+            pos += 1
+
+            continue
+
+        for child_key in range(child_count):
+            child_node = tree_node(_key_at(depth + 1))
+            node.child_nodes[child_key] = child_node
+            queue.append(child_node)
+            parents.append(pos)
+            child_keys.append(child_key)
+            depths.append(depth + 1)
+
+        created += child_count
+        pos += 1
+
+    mean_depth = sum(depths[index] for index in leaf_indexes) \
+        / len(leaf_indexes)
+    del leaf_indexes[max(1, int(MAX_SAMPLED_KEYS / max(mean_depth, 1))):]
+
+    return root, [_leaf_path(index, parents, child_keys)
+                  for index in leaf_indexes]
+
+
+def _leaf_path(index, parents, child_keys):
+    path = []
+
+    while parents[index] >= 0:
+        path.append(child_keys[index])
+        index = parents[index]
+
+    path.reverse()
+
+    return tuple(path)
+
+
+def make_traffic(shape, leaf_paths, samples, rng):
+    if shape == "skewed":
+        weights = [1.0 / (rank + 1) for rank in range(len(leaf_paths))]
+        traffic = rng.choices(leaf_paths, weights, k=samples)
+    else:
+        traffic = [rng.choice(leaf_paths) for _ in range(samples)]
+
+    fall_off_paths = []
+
+    for path in leaf_paths[:FALL_OFF_PATHS]:
+        if path:
+            path = list(path)
+            path[rng.randrange(len(path))] = -1
+            fall_off_paths.append(tuple(path))
+
+    for index in range(samples):
+        if fall_off_paths and rng.random() < FALL_OFF_RATIO:
+            traffic[index] = rng.choice(fall_off_paths)
+
+    return traffic
+
+
+def _traced(call, *arguments):
+    tracemalloc.start()
+
+    try:
+        value = call(*arguments)
+        memory, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return value, memory, peak_memory
+
+
+def _max_rss_kb():
+    if resource is None:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(call, arguments, max_seconds):
+    latencies = []
+    clock = time.perf_counter_ns
+    deadline = clock() + max_seconds * 1e9
+    started = clock()
+
+    for argument in arguments:
+        start = clock()
+        call(argument)
+        end = clock()
+        latencies.append(end - start)
+
+        if end > deadline:
+            break
+
+    elapsed = clock() - started
+    latencies.sort()
+
+    return {
+        "calls" : len(latencies),
+        "seconds" : elapsed / 1e9,
+        "throughput" : len(latencies) / (elapsed / 1e9) if elapsed else None,
+        "p50_ns" : latencies[len(latencies) // 2] if latencies else None,
+        "p99_ns" : latencies[min(len(latencies) - 1,
+                                 len(latencies) * 99 // 100)]
+        if latencies else None
+    }
+
+
+def _implementation(name, root, traffic, size):
+    if name == "recursive":
+        main_tree = recursive_decision_tree(root)
+
+        return main_tree, main_tree
+
+    main_tree = iterative_decision_tree(root)
+
+    if name == "compiled":
+        return main_tree.compile(), main_tree
+
+    if name == "optimized":
+        main_tree.enable_instrumentation()
+
+        for obj_status in traffic:
+            main_tree.traversal(obj_status)
+
+        profile = main_tree.instrumentation_snapshot()
+        key_hints = {getter : range(size) for getter in _key_getters}
+
+        main_tree.disable_instrumentation()
+
+        return main_tree.optimize(profile, key_hints), main_tree
+
+    return main_tree, main_tree
+
+
+def _fresh_implementation(name, shape, size, seed, traffic):
+    root = build_tree(shape, size, random.Random(seed))[0]
+
+    return _implementation(name, root, traffic, size)
+
+
+def _operation_calls(operation, main_tree, traffic, rng):
+    if operation == "traversal":
+        return main_tree.traversal, traffic
+
+    if operation == "get":
+        requests = [(rng.randrange(len(path) + 1), path) for path in traffic]
+
+        return lambda request: main_tree.get(*request), requests
+
+    if operation == "add":
+        if not hasattr(main_tree, "add"):
+            return None, None
+
+        requests = [(rng.randrange(1, len(path) + 1), path,
+                     ("bench", index))
+                    for index, path in enumerate(traffic) if path]
+
+        return (lambda request: main_tree.add(
+            request[0], request[1], request[2], "leaf")), requests
+
+    if operation == "size":
+        return (lambda _: main_tree.size()), range(len(traffic))
+
+    raise ValueError("unknown operation %r" % operation)
+
+
+def run_benchmarks(shapes=SHAPES, sizes=(10, 1000, 100000),
+                   implementations=IMPLEMENTATIONS, operations=OPERATIONS,
+                   samples=2000, seed=0, memory=True, max_seconds=2.0):
+    results = []
+
+    for shape in shapes:
+        for size in sizes:
+            rng = random.Random(seed)
+            build_start = time.perf_counter()
+            leaf_paths = build_tree(shape, size, rng)[1]
+            build_seconds = time.perf_counter() - build_start
+            traffic = make_traffic(shape, leaf_paths, samples, rng)
+
+            for name in implementations:
+                main_tree = None
+                tree_memory = peak_memory = None
+
+                for operation in operations:
+                    if main_tree is None:
+                        try:
+                            case = (name, shape, size, seed, traffic)
+
+                            if memory and tree_memory is None:
+                                (main_tree, source_tree), tree_memory, \
+                                    peak_memory = _traced(
+                                        _fresh_implementation, *case)
+                            else:
+                                main_tree, source_tree = \
+                                    _fresh_implementation(*case)
+                        except RecursionError:
+                            main_tree = RecursionError
+
+                    result = {
+                        "shape" : shape,
+                        "size" : size,
+                        "implementation" : name,
+                        "operation" : operation,
+                        "build_seconds" : build_seconds,
+                        "tree_memory_bytes" : tree_memory,
+                        "peak_memory_bytes" : peak_memory
+                    }
+
+                    if main_tree is RecursionError:
+                        result["error"] = "RecursionError"
+                        results.append(result)
+
+                        continue
+
+                    call, arguments = _operation_calls(
+                        operation, main_tree, traffic, rng)
+
+                    if call is None:
+                        continue
+
+                    try:
+                        result["tree_size"] = main_tree.size()
+                        result.update(_measure(call, arguments, max_seconds))
+                    except RecursionError:
+                        result["error"] = "RecursionError"
+
+                    results.append(result)
+
+                    if operation in MUTATING_OPERATIONS:
+                        main_tree = None
+
+    return {
+        "meta" : {
+            "python" : platform.python_version(),
+            "implementation" : platform.python_implementation(),
+            "platform" : platform.platform(),
+            "samples" : samples,
+            "seed" : seed,
+            "max_seconds" : max_seconds,
+            "created" : time.time()
+        },
+        "results" : results
+    }
+
+
+def write_training_file(path, rows, feature_count, seed=0,
+                        chunk_rows=65536):
+    rng = np.random.default_rng(seed)
+
+    with open(path, "wb") as file:
+        np.lib.format.write_array_header_1_0(file, {
+            "descr" : np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+            "fortran_order" : False,
+            "shape" : (rows, feature_count + 1)
+        })
+
+        for start in range(0, rows, chunk_rows):
+            chunk = rng.random((min(chunk_rows, rows - start),
+                                feature_count + 1), dtype=np.float32)
+            chunk[:, -1] = (chunk[:, 0] > 0.5) \
+                ^ (chunk[:, 1 % feature_count] < 0.3)
+            chunk.tofile(file)
+
+
+def _training_run(method, path, max_depth, chunk_rows):
+    from decision_tree_learning import tree_learner, npy_source
+
+    learner = tree_learner(max_depth=max_depth)
+    start = time.perf_counter()
+
+    if method == "out_of_core":
+        main_tree = learner.fit_stream(npy_source(path,
+                                                  chunk_rows=chunk_rows))
+    elif method == "in_memory":
+        data = np.load(path)
+        main_tree = learner.fit(data[:, :-1], data[:, -1])
+    else:
+        raise ValueError("unknown training method %r" % method)
+
+    return {
+        "seconds" : time.perf_counter() - start,
+        "tree_size" : main_tree.size(),
+        "max_rss_kb" : _max_rss_kb()
+    }
+
+
+def run_training_benchmarks(sizes=(100000, 1000000), feature_count=20,
+                            methods=TRAINING_METHODS, max_depth=8,
+                            chunk_rows=65536, seed=0, directory=None):
+    import tempfile
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory(dir=directory) as directory:
+        for rows in sizes:
+            path = os.path.join(directory, "training_%d.npy" % rows)
+            write_training_file(path, rows, feature_count, seed, chunk_rows)
+
+            for method in methods:
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    result = pool.submit(_training_run, method, path,
+                                         max_depth, chunk_rows).result()
+
+                result.update({
+                    "method" : method,
+                    "rows" : rows,
+                    "features" : feature_count,
+                    "file_bytes" : os.path.getsize(path)
+                })
+                results.append(result)
+
+            os.remove(path)
+
+    return {
+        "meta" : {
+            "python" : platform.python_version(),
+            "implementation" : platform.python_implementation(),
+            "platform" : platform.platform(),
+            "max_depth" : max_depth,
+            "chunk_rows" : chunk_rows,
+            "seed" : seed,
+            "created" : time.time()
+        },
+        "results" : results
+    }
+
+
+def _result_key(result):
+    return (result["shape"], result["size"], result["implementation"],
+            result["operation"])
+
+
+def compare(base, current):
+    base_results = {_result_key(result) : result
+                    for result in base["results"]}
+    rows = []
+
+    for result in current["results"]:
+        base_result = base_results.get(_result_key(result))
+
+        if not base_result or not base_result.get("throughput") \
+           or not result.get("throughput"):
+            continue
+
+        rows.append(_result_key(result) + (
+            result["throughput"] / base_result["throughput"] - 1.0,
+            result["p99_ns"] / base_result["p99_ns"] - 1.0
+            if base_result["p99_ns"] else None))
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark decision tree traversal, get, add and size")
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument("--sizes", default="10,1000,100000")
+    parser.add_argument("--implementations",
+                        default=",".join(IMPLEMENTATIONS))
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=2.0,
+                        help="time budget per operation measurement")
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "CURRENT"),
+                        help="diff two JSON result files instead of running")
+    parser.add_argument("--training", action="store_true",
+                        help="measure training time and peak RSS per "
+                        "dataset size instead of tree operations")
+    parser.add_argument("--training-methods",
+                        default=",".join(TRAINING_METHODS))
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--max-depth", type=int, default=8)
+    parser.add_argument("--chunk-rows", type=int, default=65536)
+    arguments = parser.parse_args(argv)
+
+    if arguments.compare:
+        with open(arguments.compare[0]) as file:
+            base = json.load(file)
+
+        with open(arguments.compare[1]) as file:
+            current = json.load(file)
+
+        for shape, size, name, operation, throughput, p99 in \
+                compare(base, current):
+            print("%-9s %9d %-10s %-9s throughput %+7.1f%%  p99 %s" % (
+                shape, size, name, operation, throughput * 100,
+                "%+7.1f%%" % (p99 * 100) if p99 is not None else "n/a"))
+
+        return 0
+
+    sizes = [int(size) for size in arguments.sizes.split(",")]
+
+    if arguments.training:
+        report = run_training_benchmarks(
+            sizes,
+            arguments.features,
+            arguments.training_methods.split(","),
+            arguments.max_depth,
+            arguments.chunk_rows,
+            arguments.seed)
+    else:
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+        report = run_benchmarks(
+            arguments.shapes.split(","),
+            sizes,
+            arguments.implementations.split(","),
+            arguments.operations.split(","),
+            arguments.samples,
+            arguments.seed,
+            not arguments.no_memory,
+            arguments.max_seconds)
+
+    output = json.dumps(report, indent=2)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,168 +1,2606 @@
-from queue import Queue
+from array import array
+import asyncio
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from keyword import iskeyword
+import mmap
+from numbers import Real
+from operator import attrgetter
+from inspect import isawaitable
+import pickle
+import sqlite3
+import struct
+from threading import Lock
+from time import perf_counter
+from weakref import ref
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_built_nodes = 0
+
 
 class tree_node:
-    __slots__ = ("decision", "child_nodes")
+    __slots__ = ("decision", "child_nodes", "vectorized_decision", "memoize")
+
+    def __init__(self, decision, vectorized_decision=None, memoize=False):
+        global _built_nodes
+
+        _built_nodes += 1
+        self.decision = decision
+        self.child_nodes = {}
+        self.vectorized_decision = vectorized_decision
+        self.memoize = memoize
+
+
+class decision_spec:
+    __slots__ = ("attribute", "reads")
+
+    def __init__(self, attribute):
+        self.attribute = attribute
+        self.reads = (attribute,)
+
+    def __repr__(self):
+        return "%s%r" % (type(self).__name__, self.spec()[1:])
+
+
+class equality_map(decision_spec):
+    __slots__ = ("mapping", "default", "_table")
+
+    def __init__(self, attribute, mapping, default=None):
+        decision_spec.__init__(self, attribute)
+        self.mapping = dict(mapping)
+        self.default = default
+        self._table = None
+
+    def __call__(self, obj_status):
+        return self.mapping.get(getattr(obj_status, self.attribute),
+                                self.default)
+
+    def keys(self):
+        return set(self.mapping.values()) | {self.default}
+
+    def spec(self):
+        return ("equality_map", self.attribute, tuple(self.mapping.items()),
+                self.default)
+
+    def _code_table(self):
+        keys = list(dict.fromkeys(self.mapping.values()))
+
+        if self.default not in keys:
+            keys.append(self.default)
+
+        key_codes = {key : code for code, key in enumerate(keys)}
+        values = list(self.mapping)
+
+        if values and (all(isinstance(value, str) for value in values)
+                       or all(isinstance(value, Real) for value in values)):
+            order = sorted(range(len(values)), key=values.__getitem__)
+            sorted_values = np.asarray([values[pos] for pos in order])
+            value_codes = np.asarray(
+                [key_codes[self.mapping[values[pos]]] for pos in order],
+                dtype=np.intp)
+
+            if sorted_values.dtype.kind not in "biufU":
+                sorted_values = value_codes = None
+        else:
+            sorted_values = value_codes = None
+
+        return tuple(keys), key_codes, sorted_values, value_codes
+
+    def codes(self, columns):
+        if self._table is None:
+            self._table = self._code_table()
+
+        keys, key_codes, values, value_codes = self._table
+        column = np.asarray(columns[self.attribute])
+        default_code = key_codes[self.default]
+
+        if values is not None and (
+                column.dtype.kind == values.dtype.kind == "U"
+                or column.dtype.kind in "biuf"
+                and values.dtype.kind in "biuf"):
+            positions = np.searchsorted(values, column)
+            np.minimum(positions, len(values) - 1, out=positions)
+
+            return np.where(values[positions] == column,
+                            value_codes[positions], default_code), keys
+
+        try:
+            uniques, inverse = np.unique(column, return_inverse=True)
+        except TypeError:
+            uniques, inverse = column, np.arange(len(column))
+
+        unique_codes = np.fromiter(
+            (key_codes[self.mapping.get(value, self.default)]
+             for value in uniques.tolist()),
+            dtype=np.intp, count=len(uniques))
+
+        return unique_codes[inverse.ravel()], keys
+
+    def vectorized(self, columns):
+        codes, keys = self.codes(columns)
+        child_keys = np.empty(len(keys), dtype=object)
+        child_keys[:] = keys
+
+        return child_keys[codes]
+
+
+class threshold_split(decision_spec):
+    __slots__ = ("thresholds", "_array")
+
+    def __init__(self, attribute, thresholds):
+        decision_spec.__init__(self, attribute)
+        self.thresholds = tuple(sorted(thresholds))
+        self._array = None
+
+    def __call__(self, obj_status):
+        return bisect_right(self.thresholds,
+                            getattr(obj_status, self.attribute))
+
+    def keys(self):
+        return range(len(self.thresholds) + 1)
+
+    def spec(self):
+        return ("threshold_split", self.attribute, self.thresholds)
+
+    def vectorized(self, columns):
+        if self._array is None:
+            self._array = np.asarray(self.thresholds)
+
+        return np.searchsorted(self._array, columns[self.attribute],
+                               side="right")
+
+    def codes(self, columns):
+        return self.vectorized(columns), self.keys()
+
+
+class set_membership(decision_spec):
+    __slots__ = ("members",)
+
+    def __init__(self, attribute, members):
+        decision_spec.__init__(self, attribute)
+        self.members = frozenset(members)
+
+    def __call__(self, obj_status):
+        return getattr(obj_status, self.attribute) in self.members
+
+    def keys(self):
+        return (False, True)
+
+    def spec(self):
+        return ("set_membership", self.attribute, tuple(self.members))
+
+    def vectorized(self, columns):
+        return np.isin(columns[self.attribute], list(self.members))
+
+    def codes(self, columns):
+        return self.vectorized(columns).view(np.int8), self.keys()
+
+
+class constant_leaf:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+    def __repr__(self):
+        return "constant_leaf(%r)" % (self.value,)
+
+    def spec(self):
+        return ("constant_leaf", self.value)
+
+
+_decision_specs = {
+    "equality_map" : equality_map,
+    "threshold_split" : threshold_split,
+    "set_membership" : set_membership,
+    "constant_leaf" : constant_leaf
+}
+
+
+def _spec_decision(spec):
+    if not spec or spec[0] not in _decision_specs:
+        raise ValueError("unknown decision spec %r" % (spec,))
+
+    return _decision_specs[spec[0]](*spec[1:])
+
+
+class range_node(tree_node):
+    __slots__ = ()
+
+    def __init__(self, attribute, thresholds, memoize=False):
+        tree_node.__init__(self, threshold_split(attribute, thresholds),
+                           None, memoize)
+
+    @property
+    def attribute(self):
+        return self.decision.attribute
+
+    @property
+    def thresholds(self):
+        return self.decision.thresholds
+
+    def bucket(self, value):
+        return bisect_right(self.decision.thresholds, value)
+
+    def bounds(self, key):
+        thresholds = self.decision.thresholds
+
+        return (thresholds[key - 1] if key > 0 else None,
+                thresholds[key] if key < len(thresholds) else None)
+
+
+def _make_node(decision, vectorized_decision=None, memoize=False):
+    node = object.__new__(tree_node)
+    node.decision = decision
+    node.child_nodes = {}
+    node.vectorized_decision = vectorized_decision
+    node.memoize = memoize
+
+    return node
+
+
+def _new_node(decision):
+    if isinstance(decision, tree_node):
+        return decision
+
+    return _make_node(decision)
+
+
+def _subtree_size(node):
+    return _unfold(_count_step, (node,)) if node.child_nodes else 1
+
+
+def _release(node):
+    if isinstance(node, _backed_tree_node):
+        node._cache.discard(node)
+
+
+def _memoized_decision(memo, memo_key, decision, obj_status):
+    if memo_key in memo:
+        return memo[memo_key]
+
+    child_key = memo[memo_key] = decision(obj_status)
+
+    return child_key
+
+
+async def _async_decision(node, obj_status, memo):
+    if node.memoize and node.decision in memo:
+        return memo[node.decision]
+
+    child_key = node.decision(obj_status)
+
+    if isawaitable(child_key):
+        child_key = await child_key
+
+    if node.memoize:
+        memo[node.decision] = child_key
+
+    return child_key
+
+
+def _partition(node, objs_status, indexes, memo):
+    partitions = {}
+    decision = node.decision
+
+    if not node.memoize:
+        child_keys = [decision(objs_status[index]) for index in indexes]
+    else:
+        child_keys = [
+            _memoized_decision(
+                memo, (decision, index), decision, objs_status[index])
+            for index in indexes
+        ]
+
+    for index, child_key in zip(indexes, child_keys):
+        if child_key in partitions:
+            partitions[child_key].append(index)
+        else:
+            partitions[child_key] = [index]
+
+    return partitions
+
+
+def _batch_length(columns):
+    if isinstance(columns, dict):
+        return len(next(iter(columns.values()))) if columns else 0
+
+    return len(columns)
+
+
+def _batch_rows(columns, indexes):
+    if isinstance(columns, dict):
+        return {name : column[indexes] for name, column in columns.items()}
+
+    return columns[indexes]
+
+
+def _code_partition(codes, keys, indexes):
+    counts = np.bincount(codes, minlength=len(keys))
+
+    if np.count_nonzero(counts) == 1:
+        return {keys[int(np.flatnonzero(counts)[0])] : indexes}
+
+    order = np.argsort(codes.astype(np.min_scalar_type(len(keys)),
+                                    copy=False), kind="stable")
+
+    return {
+        keys[code] : child_indexes
+        for code, child_indexes in enumerate(
+            np.split(indexes[order], np.cumsum(counts)[:-1]))
+        if counts[code]
+    }
+
+
+def _vectorized_partition(node, columns, indexes, whole_batch):
+    vectorized_decision = node.vectorized_decision
+
+    if vectorized_decision is None \
+       and not isinstance(node.decision, decision_spec):
+        raise ValueError(
+            "tree_node with decision %r has no vectorized_decision"
+            % (node.decision,))
+
+    batch = columns if whole_batch else _batch_rows(columns, indexes)
+
+    if vectorized_decision is None:
+        return _code_partition(*node.decision.codes(batch), indexes)
+
+    child_keys = np.asarray(vectorized_decision(batch))
+
+    try:
+        unique_keys, inverse = np.unique(child_keys, return_inverse=True)
+    except TypeError:
+        partitions = {}
+
+        for pos, child_key in enumerate(child_keys.tolist()):
+            if child_key in partitions:
+                partitions[child_key].append(pos)
+            else:
+                partitions[child_key] = [pos]
+
+        return {
+            child_key : indexes[positions]
+            for child_key, positions in partitions.items()
+        }
+
+    order = np.argsort(inverse.ravel(), kind="stable")
+    bounds = np.cumsum(np.bincount(inverse.ravel()))[:-1]
+
+    return {
+        child_key.item() if isinstance(child_key, np.generic) else child_key :
+        child_indexes
+        for child_key, child_indexes in zip(
+            unique_keys, np.split(indexes[order], bounds))
+    }
+
+
+def reads(*attributes):
+    def decorator(decision):
+        decision.reads = attributes
+
+        return decision
+
+    return decorator
+
+
+_missing = object()
+
+leaf_cache_info = namedtuple(
+    "leaf_cache_info", ("hits", "misses", "evictions", "maxsize", "currsize"))
+
+
+class leaf_cache:
+    __slots__ = ("key", "maxsize", "hits", "misses", "evictions",
+                 "_entries", "_version", "_infer_key")
+
+    def __init__(self, key, maxsize=1024, infer_key=None):
+        self.key = key
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._infer_key = infer_key
+
+    def clear(self):
+        self._entries.clear()
+
+    def info(self):
+        return leaf_cache_info(self.hits, self.misses, self.evictions,
+                               self.maxsize, len(self._entries))
+
+    def traversal(self, walk, obj_status, version=None):
+        if self._version != version:
+            self.clear()
+
+            if self._infer_key is not None:
+                self.key = self._infer_key()
+
+            self._version = version
+
+        feature_key = self.key(obj_status)
+        leaf_decision = self._entries.get(feature_key, _missing)
+
+        if leaf_decision is not _missing:
+            self.hits += 1
+
+            try:
+                self._entries.move_to_end(feature_key)
+            except KeyError:
+                pass
+
+            return leaf_decision
+
+        self.misses += 1
+        leaf_decision = walk(obj_status)
+        self._entries[feature_key] = leaf_decision
+
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        return leaf_decision
+
+
+def _copy_node(node):
+    copied_node = object.__new__(
+        range_node if isinstance(node, range_node) else tree_node)
+    copied_node.decision = node.decision
+    copied_node.vectorized_decision = node.vectorized_decision
+    copied_node.memoize = node.memoize
+    copied_node.child_nodes = dict(node.child_nodes)
+
+    return copied_node
+
+
+def _copy_path(path, node):
+    for parent_node, child_key in reversed(path):
+        copied_parent_node = _copy_node(parent_node)
+        copied_parent_node.child_nodes[child_key] = node
+        node = copied_parent_node
+
+    return node
+
+
+def _unpicklable_decisions(root):
+    unpicklable = []
+    stack = [((), root)] if root else []
+
+    while stack:
+        path, node = stack.pop()
+
+        for decision in (node.decision, node.vectorized_decision):
+            try:
+                pickle.dumps(decision)
+            except Exception as error:
+                unpicklable.append((path, decision, error))
+
+        for child_key, child_node in node.child_nodes.items():
+            stack.append((path + (child_key,), child_node))
+
+    return unpicklable
+
+
+def _flat_records(root):
+    nodes = [root] if root else []
+    records = []
+
+    for node in nodes:
+        records.append((node.decision, node.vectorized_decision, node.memoize,
+                        tuple(node.child_nodes)))
+        nodes.extend(node.child_nodes.values())
+
+    return records
+
+
+def _from_flat_records(records):
+    nodes = [_make_node(decision, vectorized_decision, memoize)
+             for decision, vectorized_decision, memoize, _ in records]
+    children = iter(nodes[1:])
+
+    for node, (_, _, _, child_keys) in zip(nodes, records):
+        for child_key in child_keys:
+            node.child_nodes[child_key] = next(children)
+
+    return nodes[0] if nodes else None
+
+
+_worker_tree = None
+
+
+def _parallel_initializer(records_bytes):
+    global _worker_tree
+
+    _worker_tree = iterative_decision_tree(
+        _from_flat_records(pickle.loads(records_bytes)))
+
+
+def _parallel_traversal_chunk(objs_status):
+    return _worker_tree.traversal_many(objs_status)
+
+
+class _parallel_pool:
+    __slots__ = ("executor", "workers", "root", "version")
+
+    def __init__(self, root, workers, version):
+        unpicklable = _unpicklable_decisions(root)
+
+        if unpicklable:
+            raise ValueError("decisions cannot be pickled: " + ", ".join(
+                "%r at path %r (%s)" % (decision, path, error)
+                for path, decision, error in unpicklable))
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_parallel_initializer,
+            initargs=(pickle.dumps(_flat_records(root)),))
+        self.workers = workers
+        self.root = root
+        self.version = version
+
+
+_decisions_by_name = {}
+_names_by_decision = {}
+
+
+def register_decision(decision, name=None):
+    if name is None:
+        name = "%s.%s" % (decision.__module__, decision.__qualname__)
+
+    if _decisions_by_name.get(name, decision) is not decision:
+        raise ValueError("decision name %r is already registered" % name)
+
+    _decisions_by_name[name] = decision
+    _names_by_decision[decision] = name
+
+    return decision
+
+
+_FILE_MAGIC = b"DTRE"
+_FILE_VERSION = 1
+_HEADER = struct.Struct("<4sHHIII")
+_NODE_RECORD = struct.Struct("<iiIIIB3x")
+_LENGTH = struct.Struct("<I")
+_INT_LENGTH = struct.Struct("<H")
+_FLOAT = struct.Struct("<d")
+
+_DECISION_NAME, _DECISION_SPEC = range(2)
+
+_KEY_NONE, _KEY_FALSE, _KEY_TRUE, _KEY_INT, _KEY_FLOAT, _KEY_STR, \
+    _KEY_BYTES, _KEY_TUPLE = range(8)
+
+
+def _encode_key(buffer, key):
+    if key is None:
+        buffer.append(_KEY_NONE)
+    elif key is False or key is True:
+        buffer.append(_KEY_TRUE if key else _KEY_FALSE)
+    elif type(key) is int:
+        data = key.to_bytes((key.bit_length() + 8) // 8, "little",
+                            signed=True)
+        buffer.append(_KEY_INT)
+        buffer += _INT_LENGTH.pack(len(data)) + data
+    elif type(key) is float:
+        buffer.append(_KEY_FLOAT)
+        buffer += _FLOAT.pack(key)
+    elif type(key) is str:
+        data = key.encode("utf-8")
+        buffer.append(_KEY_STR)
+        buffer += _LENGTH.pack(len(data)) + data
+    elif type(key) is bytes:
+        buffer.append(_KEY_BYTES)
+        buffer += _LENGTH.pack(len(key)) + key
+    elif type(key) is tuple:
+        buffer.append(_KEY_TUPLE)
+        buffer += _LENGTH.pack(len(key))
+
+        for item in key:
+            _encode_key(buffer, item)
+    else:
+        raise TypeError("child key %r cannot be serialized" % (key,))
+
+
+def _decode_key(data, offset):
+    tag = data[offset]
+    offset += 1
+
+    if tag == _KEY_NONE:
+        return None, offset
+
+    if tag == _KEY_FALSE or tag == _KEY_TRUE:
+        return tag == _KEY_TRUE, offset
+
+    if tag == _KEY_INT:
+        length, = _INT_LENGTH.unpack_from(data, offset)
+        offset += _INT_LENGTH.size
+
+        return int.from_bytes(data[offset:offset + length], "little",
+                              signed=True), offset + length
+
+    if tag == _KEY_FLOAT:
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+
+    if tag == _KEY_TUPLE:
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        items = []
+
+        for _ in range(length):
+            item, offset = _decode_key(data, offset)
+            items.append(item)
+
+        return tuple(items), offset
+
+    length, = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    value = bytes(data[offset:offset + length])
+
+    if tag == _KEY_STR:
+        value = value.decode("utf-8")
+
+    return value, offset + length
+
+
+def _decision_name(decision, parents, index):
+    if isinstance(decision, (decision_spec, constant_leaf)):
+        return decision.spec()
+
+    try:
+        return _names_by_decision[decision]
+    except (KeyError, TypeError):
+        key_path = []
+
+        while parents[index] is not None:
+            index, child_key = parents[index]
+            key_path.append(child_key)
+
+        raise ValueError(
+            "decision %r at path %r is not registered"
+            % (decision, tuple(reversed(key_path)))) from None
+
+
+def _registered_decision(name):
+    if name is None:
+        return None
+
+    if type(name) is bytes:
+        return _spec_decision(_decode_key(name, 0)[0])
+
+    if name not in _decisions_by_name:
+        raise ValueError("decision %r is not registered" % name)
+
+    return _decisions_by_name[name]
+
+
+def _save_tree(root, path):
+    nodes = [root] if root else []
+    parents = [None]
+    names = {}
+    keys = {}
+    records = bytearray()
+    pos = 0
+
+    def name_index(decision, index):
+        if decision is None:
+            return -1
+
+        return names.setdefault(_decision_name(decision, parents, index),
+                                len(names))
+
+    while pos < len(nodes):
+        node = nodes[pos]
+        key_index = 0
+
+        if parents[pos] is not None:
+            child_key = parents[pos][1]
+            key_index = keys.setdefault((type(child_key), child_key),
+                                        len(keys))
+
+        records += _NODE_RECORD.pack(
+            name_index(node.decision, pos),
+            name_index(node.vectorized_decision, pos),
+            key_index,
+            len(nodes),
+            len(node.child_nodes),
+            bool(node.memoize))
+
+        for child_key, child_node in node.child_nodes.items():
+            nodes.append(child_node)
+            parents.append((pos, child_key))
+
+        pos += 1
+
+    tables = bytearray()
+
+    for name in names:
+        if type(name) is tuple:
+            tables.append(_DECISION_SPEC)
+            _encode_key(tables, name)
+        else:
+            data = name.encode("utf-8")
+            tables.append(_DECISION_NAME)
+            tables += _LENGTH.pack(len(data)) + data
+
+    for _, child_key in keys:
+        _encode_key(tables, child_key)
+
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, 0,
+                                len(nodes), len(names), len(keys)))
+        file.write(tables)
+        file.write(records)
+
+
+class _lazy_tree_node(tree_node):
+    __slots__ = ("_reader", "_index")
+
+    def __getattr__(self, name):
+        if name != "child_nodes":
+            raise AttributeError(name)
+
+        child_nodes = self.child_nodes = self._reader.child_nodes(self._index)
+
+        return child_nodes
+
+    def __reduce__(self):
+        return _restore_tree_node, (self.decision, self.vectorized_decision,
+                                    self.memoize, dict(self.child_nodes))
+
+
+def _restore_tree_node(decision, vectorized_decision, memoize, child_nodes):
+    node = _make_node(decision, vectorized_decision, memoize)
+    node.child_nodes = child_nodes
+
+    return node
+
+
+class _mapped_tree_reader:
+    __slots__ = ("_data", "_decisions", "_keys", "_records_offset",
+                 "node_count")
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.node_count, name_count, key_count = \
+            _HEADER.unpack_from(self._data, 0)
+
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            self._data.close()
+
+            raise ValueError("%r is not a decision tree file" % (path,))
+
+        offset = _HEADER.size
+        self._decisions = []
+
+        for _ in range(name_count):
+            tag = self._data[offset]
+            offset += 1
+
+            if tag == _DECISION_SPEC:
+                spec, offset = _decode_key(self._data, offset)
+                self._decisions.append(_spec_decision(spec))
+
+                continue
+
+            length, = _LENGTH.unpack_from(self._data, offset)
+            offset += _LENGTH.size
+            name = self._data[offset:offset + length].decode("utf-8")
+            offset += length
+
+            if name not in _decisions_by_name:
+                raise ValueError("decision %r is not registered" % name)
+
+            self._decisions.append(_decisions_by_name[name])
+
+        self._keys = []
+
+        for _ in range(key_count):
+            child_key, offset = _decode_key(self._data, offset)
+            self._keys.append(child_key)
+
+        self._records_offset = offset
+
+    def close(self):
+        self._data.close()
+
+    def _record(self, index):
+        return _NODE_RECORD.unpack_from(
+            self._data, self._records_offset + index * _NODE_RECORD.size)
+
+    def node(self, index, record=None):
+        decision_index, vectorized_index, _, _, _, memoize = \
+            record or self._record(index)
+        node = object.__new__(_lazy_tree_node)
+        node.decision = \
+            self._decisions[decision_index] if decision_index >= 0 else None
+        node.vectorized_decision = \
+            self._decisions[vectorized_index] if vectorized_index >= 0 \
+            else None
+        node.memoize = bool(memoize)
+        node._reader = self
+        node._index = index
+
+        return node
+
+    def child_nodes(self, index):
+        _, _, _, first_child, child_count, _ = self._record(index)
+        child_nodes = {}
+
+        for child_index in range(first_child, first_child + child_count):
+            record = self._record(child_index)
+            child_nodes[self._keys[record[2]]] = self.node(child_index, record)
+
+        return child_nodes
+
+
+def _load_tree(path):
+    reader = _mapped_tree_reader(path)
+
+    return (reader.node(0) if reader.node_count else None), \
+        reader.node_count, reader
+
+
+def _stored_decision(decision, parents, index):
+    if decision is None:
+        return None
+
+    name = _decision_name(decision, parents, index)
+
+    if type(name) is tuple:
+        buffer = bytearray()
+        _encode_key(buffer, name)
+
+        return bytes(buffer)
+
+    return name
+
+
+def _save_sqlite_tree(root, path):
+    nodes = [root] if root else []
+    parents = [None]
+    rows = []
+    pos = 0
+
+    while pos < len(nodes):
+        node = nodes[pos]
+        parent_index = child_key = None
+
+        if parents[pos] is not None:
+            parent_index, child_key = parents[pos]
+            buffer = bytearray()
+            _encode_key(buffer, child_key)
+            child_key = bytes(buffer)
+
+        rows.append((
+            pos, parent_index, child_key,
+            _stored_decision(node.decision, parents, pos),
+            _stored_decision(node.vectorized_decision, parents, pos),
+            bool(node.memoize),
+            len(node.child_nodes)))
+
+        for child_key, child_node in node.child_nodes.items():
+            nodes.append(child_node)
+            parents.append((pos, child_key))
+
+        pos += 1
+
+    open(path, "wb").close()
+    connection = sqlite3.connect(path)
+
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE nodes (id INTEGER PRIMARY KEY, parent INTEGER, "
+                "child_key BLOB, decision TEXT, vectorized_decision TEXT, "
+                "memoize INTEGER, child_count INTEGER)")
+            connection.execute("CREATE INDEX nodes_parent ON nodes (parent)")
+            connection.executemany(
+                "INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    finally:
+        connection.close()
+
+
+subtree_record = namedtuple(
+    "subtree_record",
+    ("decision", "vectorized_decision", "memoize", "ref", "child_count"))
+
+subtree_cache_info = namedtuple(
+    "subtree_cache_info",
+    ("loads", "evictions", "pinned", "maxsize", "currsize"))
+
+
+class file_subtree_loader:
+    __slots__ = ("_reader", "node_count")
+
+    def __init__(self, path):
+        self._reader = _mapped_tree_reader(path)
+        self.node_count = self._reader.node_count
+
+    def close(self):
+        self._reader.close()
+
+    def _subtree_record(self, index, record):
+        decision_index, vectorized_index, _, _, child_count, memoize = record
+        decisions = self._reader._decisions
+
+        return subtree_record(
+            decisions[decision_index] if decision_index >= 0 else None,
+            decisions[vectorized_index] if vectorized_index >= 0 else None,
+            bool(memoize), index, child_count)
+
+    def root(self):
+        if not self.node_count:
+            return None
+
+        return self._subtree_record(0, self._reader._record(0))
+
+    def children(self, ref):
+        _, _, _, first_child, child_count, _ = self._reader._record(ref)
+
+        for index in range(first_child, first_child + child_count):
+            record = self._reader._record(index)
+
+            yield self._reader._keys[record[2]], \
+                self._subtree_record(index, record)
+
+
+class sqlite_subtree_loader:
+    __slots__ = ("_connection", "node_count")
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self.node_count, = self._connection.execute(
+            "SELECT COUNT(*) FROM nodes").fetchone()
+
+    def close(self):
+        self._connection.close()
+
+    def _subtree_record(self, row):
+        ref, decision, vectorized_decision, memoize, child_count = row
+
+        return subtree_record(
+            _registered_decision(decision),
+            _registered_decision(vectorized_decision),
+            bool(memoize), ref, child_count)
+
+    def root(self):
+        row = self._connection.execute(
+            "SELECT id, decision, vectorized_decision, memoize, child_count "
+            "FROM nodes WHERE parent IS NULL").fetchone()
+
+        return self._subtree_record(row) if row else None
+
+    def children(self, ref):
+        rows = self._connection.execute(
+            "SELECT child_key, id, decision, vectorized_decision, memoize, "
+            "child_count FROM nodes WHERE parent = ? ORDER BY id",
+            (ref,)).fetchall()
+
+        for row in rows:
+            yield _decode_key(row[0], 0)[0], self._subtree_record(row[1:])
+
+
+_node_child_nodes = tree_node.child_nodes
+
+
+class _resident_child_nodes(dict):
+    __slots__ = ("_node",)
+
+    def __setitem__(self, key, value):
+        self._node._cache.pin(self._node, self)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._node._cache.pin(self._node, self)
+        dict.__delitem__(self, key)
+
+    def __ior__(self, other):
+        self._node._cache.pin(self._node, self)
+        dict.update(self, other)
+
+        return self
+
+    def clear(self):
+        self._node._cache.pin(self._node, self)
+        dict.clear(self)
+
+    def pop(self, *args):
+        self._node._cache.pin(self._node, self)
+
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._node._cache.pin(self._node, self)
+
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self._node._cache.pin(self._node, self)
+
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self._node._cache.pin(self._node, self)
+        dict.update(self, *args, **kwargs)
+
+
+class _backed_tree_node(tree_node):
+    __slots__ = ("_cache", "_ref", "_parent", "_key")
+
+    def __setattr__(self, name, value):
+        self._cache.pin(self)
+        object.__setattr__(self, name, value)
+
+    @property
+    def child_nodes(self):
+        if self._ref is None:
+            return _node_child_nodes.__get__(self)
+
+        return self._cache.child_nodes(self)
+
+    @child_nodes.setter
+    def child_nodes(self, child_nodes):
+        if self._ref is None:
+            _node_child_nodes.__set__(self, child_nodes)
+        else:
+            self._cache._pinned[self._ref] = child_nodes
+
+    def __reduce__(self):
+        return _restore_tree_node, (self.decision, self.vectorized_decision,
+                                    self.memoize, dict(self.child_nodes))
+
+
+class subtree_cache:
+    __slots__ = ("loader", "maxsize", "loads", "evictions", "_entries",
+                 "_pinned", "_lock")
+
+    def __init__(self, loader, maxsize=1024):
+        self.loader = loader
+        self.maxsize = maxsize
+        self.loads = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self._lock = Lock()
+
+    def info(self):
+        return subtree_cache_info(self.loads, self.evictions,
+                                  len(self._pinned), self.maxsize,
+                                  len(self._entries))
+
+    def root(self):
+        record = self.loader.root()
+
+        return self.node(record) if record else None
+
+    def node(self, record, parent=None, key=None):
+        node = object.__new__(_backed_tree_node)
+        object.__setattr__(node, "decision", record.decision)
+        object.__setattr__(node, "vectorized_decision",
+                           record.vectorized_decision)
+        object.__setattr__(node, "memoize", record.memoize)
+        object.__setattr__(node, "_cache", self)
+        object.__setattr__(node, "_parent", parent)
+        object.__setattr__(node, "_key", key)
+
+        if record.child_count:
+            object.__setattr__(node, "_ref", record.ref)
+        else:
+            object.__setattr__(node, "_ref", None)
+            _node_child_nodes.__set__(node, self._child_nodes(node))
+
+        return node
+
+    def _child_nodes(self, node):
+        child_nodes = _resident_child_nodes()
+        child_nodes._node = node
+
+        return child_nodes
+
+    def child_nodes(self, node):
+        ref = node._ref
+        child_nodes = self._entries.get(ref)
+
+        if child_nodes is not None:
+            try:
+                self._entries.move_to_end(ref)
+            except KeyError:
+                pass
+
+            return child_nodes
+
+        child_nodes = self._pinned.get(ref)
+
+        if child_nodes is not None:
+            return child_nodes
+
+        return self._load(node)
+
+    def _load(self, node):
+        ref = node._ref
+
+        with self._lock:
+            child_nodes = self._pinned.get(ref, self._entries.get(ref))
+
+            if child_nodes is not None:
+                return child_nodes
+
+            child_nodes = self._child_nodes(node)
+
+            for child_key, record in self.loader.children(ref):
+                dict.__setitem__(child_nodes, child_key,
+                                 self.node(record, node, child_key))
+
+            self.loads += 1
+            self._entries[ref] = child_nodes
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return child_nodes
+
+    def pin(self, node, child_nodes=None):
+        child = None
+
+        while node is not None:
+            ref = node._ref
+
+            if ref is not None:
+                pinned = ref in self._pinned
+                entry = self._entries.pop(ref, None)
+
+                if not pinned:
+                    if child_nodes is None:
+                        child_nodes = entry
+
+                    if child_nodes is None:
+                        child_nodes = self._load(node)
+                        self._entries.pop(ref, None)
+
+                    self._pinned[ref] = child_nodes
+
+                child_nodes = self._pinned[ref]
+
+                if child is not None \
+                   and child_nodes.get(child._key) is not child:
+                    dict.__setitem__(child_nodes, child._key, child)
+
+                if pinned:
+                    return
+
+            child_nodes = None
+            child = node
+            node = node._parent
+
+    def discard(self, node):
+        stack = [node]
+
+        with self._lock:
+            while stack:
+                ref = getattr(stack.pop(), "_ref", None)
+
+                if ref is None:
+                    continue
+
+                child_nodes = self._entries.pop(ref, None)
+
+                if child_nodes is None:
+                    child_nodes = self._pinned.pop(ref, None)
+
+                if child_nodes is not None:
+                    stack.extend(child_nodes.values())
+
+
+class tree_build_error(ValueError):
+    def __init__(self, conflicts, orphans):
+        super().__init__(
+            "cannot build decision tree: conflicting paths %r, "
+            "orphan paths %r" % (conflicts, orphans))
+        self.conflicts = conflicts
+        self.orphans = orphans
+
+
+def _build_from_paths(paths):
+    if hasattr(paths, "items"):
+        paths = paths.items()
+
+    decisions = {}
+    conflicts = []
+
+    for path, decision in paths:
+        path = tuple(path)
+
+        if path in decisions and decisions[path] is not decision:
+            if path not in conflicts:
+                conflicts.append(path)
+        else:
+            decisions[path] = decision
+
+    orphans = [
+        path for path in decisions if path and path[:-1] not in decisions
+    ]
+
+    if conflicts or orphans:
+        raise tree_build_error(conflicts, orphans)
+
+    if not decisions:
+        return None, 0
+
+    nodes = {}
+
+    for path in sorted(decisions, key=len):
+        node = nodes[path] = _make_node(decisions[path])
+
+        if path:
+            nodes[path[:-1]].child_nodes[path[-1]] = node
+
+    return nodes[()], len(nodes)
+
+
+def _spec_paths(spec):
+    stack = [((), spec)] if spec else []
+
+    while stack:
+        path, spec = stack.pop()
+
+        yield path, spec.get("decision")
+
+        for child_key, child_spec in reversed(
+                list(spec.get("child_nodes", {}).items())):
+            stack.append((path + (child_key,), child_spec))
+
+
+class node_statistics:
+    __slots__ = ("_indexes", "visits", "fall_offs", "leaf_hits",
+                 "decision_time")
+
+    def __init__(self):
+        self._indexes = {}
+        self.visits = array("q")
+        self.fall_offs = array("q")
+        self.leaf_hits = array("q")
+        self.decision_time = array("d")
+
+    def index(self, node):
+        index = self._indexes.get(node)
+
+        if index is None:
+            index = self._indexes[node] = len(self.visits)
+            self.visits.append(0)
+            self.fall_offs.append(0)
+            self.leaf_hits.append(0)
+            self.decision_time.append(0.0)
+
+        return index
+
+    def forget(self, node):
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+            self._indexes.pop(node, None)
+            stack.extend(node.child_nodes.values())
+
+    def reset(self):
+        for counters in (self.visits, self.fall_offs, self.leaf_hits):
+            for index in range(len(counters)):
+                counters[index] = 0
+
+        for index in range(len(self.decision_time)):
+            self.decision_time[index] = 0.0
+
+    def snapshot(self, root):
+        snapshot = {}
+        stack = [root] if root else []
+
+        while stack:
+            node = stack.pop()
+            index = self._indexes.get(node)
+
+            if index is not None:
+                snapshot[node] = {
+                    "visits" : self.visits[index],
+                    "fall_offs" : self.fall_offs[index],
+                    "leaf_hits" : self.leaf_hits[index],
+                    "decision_time" : self.decision_time[index]
+                }
+
+            stack.extend(node.child_nodes.values())
+
+        return snapshot
+
+    def descend(self, root, obj_status, depth_level=None):
+        memo = None
+        current_depth = 0
+        node = root
+
+        while True:
+            index = self.index(node)
+            self.visits[index] += 1
+
+            if depth_level is not None and current_depth >= depth_level:
+                return node
+
+            if not node.child_nodes:
+                if depth_level is not None:
+                    return None
+
+                self.leaf_hits[index] += 1
+
+                return node
+
+            start = perf_counter()
+
+            if not node.memoize:
+                child_key = node.decision(obj_status)
+            else:
+                if memo is None:
+                    memo = {}
+
+                child_key = _memoized_decision(
+                    memo, node.decision, node.decision, obj_status)
+
+            self.decision_time[index] += perf_counter() - start
+
+            if child_key not in node.child_nodes:
+                self.fall_offs[index] += 1
+
+                return None
+
+            node = node.child_nodes[child_key]
+            current_depth += 1
+
+
+def _reorder_by_profile(root, profile):
+    nodes = [root] if root else []
+    visits = []
+
+    for node in nodes:
+        visits.append(profile.get(node, {}).get("visits", 0))
+
+        if not node.child_nodes:
+            continue
+
+        child_nodes = sorted(
+            node.child_nodes.items(),
+            key=lambda child: -profile.get(child[1], {}).get("visits", 0))
+
+        if [child_key for child_key, _ in child_nodes] \
+           != list(node.child_nodes):
+            node.child_nodes = dict(child_nodes)
+
+        nodes.extend(child_node for _, child_node in child_nodes)
+
+    return visits
+
+
+class compiled_decision_tree:
+    __slots__ = ("_entry", "_size", "_root", "_source", "_version",
+                 "_specialized")
+
+    def __init__(self, root=None, source=None):
+        self._entry = None
+        self._size = 0
+        self._specialized = None
+        self._root = root if source is None else None
+        self._source = ref(source) if source is not None else None
+        self._version = source._version if source is not None else None
+
+        if not root:
+            return
+
+        nodes = [root]
+        offsets = []
+
+        for node in nodes:
+            offsets.append(len(nodes))
+            nodes.extend(node.child_nodes.values())
+
+        interned_key_maps = {}
+        entries = [None] * len(nodes)
+
+        for index in range(len(nodes) - 1, -1, -1):
+            node = nodes[index]
+
+            if not node.child_nodes:
+                entries[index] = (node.decision, None, None)
+
+                continue
+
+            keys = tuple(node.child_nodes)
+
+            if keys not in interned_key_maps:
+                interned_key_maps[keys] = {
+                    key : position for position, key in enumerate(keys)
+                }
+
+            offset = offsets[index]
+            entries[index] = (
+                node.decision, interned_key_maps[keys],
+                tuple(entries[offset:offset + len(keys)]))
+
+        self._entry = entries[0]
+        self._size = len(nodes)
+
+    def is_stale(self):
+        source = self._source() if self._source is not None else None
+
+        return source is not None and source._version != self._version
+
+    def _check_source(self):
+        if self.is_stale():
+            raise RuntimeError("decision tree was modified after compile()")
+
+    def size(self):
+        self._check_source()
+
+        return self._size
+
+    def specialize(self, visits, key_hints, max_keys=3, max_nodes=64):
+        if self._entry is None:
+            return
+
+        entries = [self._entry]
+        offsets = []
+
+        for _, _, child_entries in entries:
+            offsets.append(len(entries))
+
+            if child_entries is not None:
+                entries.extend(child_entries)
+
+        lines = ["def specialized(obj_status):"]
+        namespace = {"bisect_right" : bisect_right}
+        budget = [max_nodes]
+
+        def hint(decision):
+            try:
+                return key_hints.get(decision)
+            except TypeError:
+                return None
+
+        def visited(index):
+            return visits[index] if index < len(visits) else 0
+
+        def walk(entry, pad):
+            lines.append("%sdecision, key_map, child_entries = %s"
+                         % (pad, entry))
+            lines.append("%swhile key_map is not None:" % pad)
+            lines.append("%s    position = key_map.get(decision(obj_status))"
+                         % pad)
+            lines.append("%s    if position is None:" % pad)
+            lines.append("%s        return None" % pad)
+            lines.append("%s    decision, key_map, child_entries = "
+                         "child_entries[position]" % pad)
+            lines.append("%sreturn decision" % pad)
+
+        def emit(index, indent):
+            pad = "    " * indent
+            decision, key_map, child_entries = entries[index]
+
+            if key_map is None:
+                namespace["leaf_%d" % index] = decision
+                lines.append("%sreturn leaf_%d" % (pad, index))
+
+                return
+
+            spec = isinstance(decision, decision_spec)
+            keys = decision.keys() if spec else hint(decision)
+
+            if keys is None or budget[0] <= 0 or indent > 32:
+                namespace["entry_%d" % index] = entries[index]
+                walk("entry_%d" % index, pad)
+
+                return
+
+            budget[0] -= 1
+            offset = offsets[index]
+            namespace["decision_%d" % index] = decision
+            namespace["key_map_%d" % index] = key_map
+            namespace["child_entries_%d" % index] = child_entries
+
+            value = "decision_%d(obj_status)" % index
+
+            if spec and decision.attribute.isidentifier() \
+               and not iskeyword(decision.attribute):
+                attribute = "obj_status.%s" % decision.attribute
+
+                if type(decision) is threshold_split:
+                    namespace["thresholds_%d" % index] = decision.thresholds
+                    value = "bisect_right(thresholds_%d, %s)" \
+                        % (index, attribute)
+                elif type(decision) is equality_map:
+                    namespace["mapping_%d" % index] = decision.mapping
+                    namespace["default_%d" % index] = decision.default
+                    value = "mapping_%d.get(%s, default_%d)" \
+                        % (index, attribute, index)
+                elif type(decision) is set_membership:
+                    namespace["members_%d" % index] = decision.members
+                    value = "%s in members_%d" % (attribute, index)
+
+            lines.append("%schild_key = %s" % (pad, value))
+
+            hot_children = sorted(
+                ((visited(offset + position), position, key)
+                 for key, position in key_map.items() if key in keys),
+                key=lambda child: -child[0])
+
+            for child_visits, position, key in hot_children[:max_keys]:
+                if not child_visits \
+                   or child_visits * (max_keys + 1) < visited(index):
+                    break
+
+                namespace["key_%d_%d" % (index, position)] = key
+                lines.append("%sif child_key == key_%d_%d:"
+                             % (pad, index, position))
+                emit(offset + position, indent + 1)
+
+            lines.append("%sposition = key_map_%d.get(child_key)"
+                         % (pad, index))
+            lines.append("%sif position is None:" % pad)
+            lines.append("%s    return None" % pad)
+            walk("child_entries_%d[position]" % index, pad)
+
+        emit(0, 1)
+        exec("\n".join(lines), namespace)
+        self._specialized = namespace["specialized"]
+
+    def traversal(self, obj_status):
+        if self._source is not None:
+            source = self._source()
+
+            if source is not None and source._version != self._version:
+                raise RuntimeError(
+                    "decision tree was modified after compile()")
+
+        if self._specialized is not None:
+            return self._specialized(obj_status)
+
+        if self._entry is None:
+            return None
+
+        decision, key_map, child_entries = self._entry
+
+        while key_map is not None:
+            position = key_map.get(decision(obj_status))
+
+            if position is None:
+                return None
+
+            decision, key_map, child_entries = child_entries[position]
+
+        return decision
+
+    def get(self, depth_level, obj_status):
+        self._check_source()
+
+        if self._source is None:
+            node = self._root
+        else:
+            source = self._source()
+
+            if source is None:
+                raise RuntimeError(
+                    "the source of this compiled tree was released")
+
+            node = source._root
+
+        current_depth = 0
+
+        while node:
+            if current_depth >= depth_level:
+                return node
+
+            if not node.child_nodes:
+                return None
+
+            child_key = node.decision(obj_status)
+
+            if child_key not in node.child_nodes:
+                return None
+
+            node = node.child_nodes[child_key]
+            current_depth += 1
+
+        return None
+
+
+def _unfold(step, arguments):
+    stack = [arguments]
+    steps = 0
+
+    while stack:
+        stack.extend(step(*stack.pop()))
+        steps += 1
+
+    return steps
+
+
+def _count_step(node):
+    return [(child_node,) for child_node in node.child_nodes.values()]
+
+
+def _traversal_walk(node, obj_status):
+    memo = None
+
+    while node.child_nodes:
+        if not node.memoize:
+            child_key = node.decision(obj_status)
+        else:
+            if memo is None:
+                memo = {}
+
+            child_key = _memoized_decision(
+                memo, node.decision, node.decision, obj_status)
+
+        if child_key not in node.child_nodes:
+            return None
+
+        node = node.child_nodes[child_key]
+
+    return node.decision
+
+
+def _traversal_many_step(node, indexes, objs_status, leaf_decisions, memo):
+    if not node.child_nodes:
+        for index in indexes:
+            leaf_decisions[index] = node.decision
+
+        return ()
+
+    partitions = _partition(node, objs_status, indexes, memo)
+
+    return [
+        (node.child_nodes[child_key], child_indexes, objs_status,
+         leaf_decisions, memo)
+        for child_key, child_indexes in partitions.items()
+        if child_key in node.child_nodes
+    ]
+
+
+def _get_walk(node, obj_status, depth_level):
+    memo = None
+
+    for _ in range(depth_level):
+        if not node.child_nodes:
+            return None
+
+        if not node.memoize:
+            child_key = node.decision(obj_status)
+        else:
+            if memo is None:
+                memo = {}
+
+            child_key = _memoized_decision(
+                memo, node.decision, node.decision, obj_status)
+
+        if child_key not in node.child_nodes:
+            return None
+
+        node = node.child_nodes[child_key]
+
+    return node
+
+
+def _get_many_step(node, current_depth, indexes, depth_level, objs_status,
+                   nodes, memo):
+    if current_depth >= depth_level:
+        for index in indexes:
+            nodes[index] = node
+
+        return ()
+
+    if not node.child_nodes:
+        return ()
+
+    partitions = _partition(node, objs_status, indexes, memo)
+
+    return [
+        (node.child_nodes[child_key], current_depth + 1, child_indexes,
+         depth_level, objs_status, nodes, memo)
+        for child_key, child_indexes in partitions.items()
+        if child_key in node.child_nodes
+    ]
+
+
+def _prune_step(node, predicate, pruned):
+    kept = []
+
+    for child_key, child_node in list(node.child_nodes.items()):
+        if predicate(child_node):
+            del node.child_nodes[child_key]
+            pruned.append(child_node)
+        else:
+            kept.append((child_node, predicate, pruned))
+
+    return kept
+
+
+def _path_walk(node, keys):
+    for key in keys:
+        if key not in node.child_nodes:
+            return None
+
+        node = node.child_nodes[key]
+
+    return node
+
+
+class _base_decision_tree:
+    __slots__ = ("_root", "_size", "_built", "_version", "_mapped_file",
+                 "__weakref__")
+
+    def __init__(self, root=None):
+        self._root = root
+        self._size = None
+        self._built = _built_nodes
+        self._version = 0
+        self._mapped_file = None
+
+    def compile(self):
+        return compiled_decision_tree(self._root, self)
+
+    def optimize(self, profile, key_hints=None):
+        visits = _reorder_by_profile(self._root, profile)
+        compiled_tree = compiled_decision_tree(self._root, self)
+        compiled_tree.specialize(visits, key_hints or {})
+
+        return compiled_tree
+
+    def save(self, path, format="binary"):
+        if format == "binary":
+            _save_tree(self._root, path)
+        elif format == "sqlite":
+            _save_sqlite_tree(self._root, path)
+        else:
+            raise ValueError("unknown tree file format %r" % (format,))
+
+    @classmethod
+    def _from_root(cls, root, size, mapped_file=None):
+        main_tree = cls(root)
+        main_tree._size = size
+        main_tree._mapped_file = mapped_file
+
+        return main_tree
+
+    @classmethod
+    def load(cls, path):
+        return cls._from_root(*_load_tree(path))
+
+    def close(self):
+        if self._mapped_file is not None:
+            self._mapped_file.close()
+            self._mapped_file = None
+
+    @classmethod
+    def load_lazy(cls, loader, maxsize=1024):
+        return cls._from_root(subtree_cache(loader, maxsize).root(),
+                              loader.node_count)
+
+    def subtree_cache_info(self):
+        if not isinstance(self._root, _backed_tree_node):
+            return None
+
+        return self._root._cache.info()
+
+    @classmethod
+    def build_from_paths(cls, paths):
+        return cls._from_root(*_build_from_paths(paths))
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls._from_root(*_build_from_paths(_spec_paths(spec)))
+
+    def size(self):
+        if self._size is None or self._built != _built_nodes:
+            return self.recount()
+
+        return self._size
+
+    def invalidate(self):
+        self._size = None
+        self._version += 1
+
+    def traversal_stream(self, objs_status, batch_size=1024,
+                         max_in_flight=None):
+        if max_in_flight is not None:
+            batch_size = min(batch_size, max_in_flight)
+
+        if batch_size < 1:
+            raise ValueError("batch_size and max_in_flight must be >= 1")
+
+        objs_status = iter(objs_status)
+
+        while True:
+            batch = list(islice(objs_status, batch_size))
+
+            if not batch:
+                return
+
+            yield from zip(batch, self.traversal_many(batch))
+
+    def add_by_path(self, keys, decision):
+        keys = tuple(keys)
+
+        if not keys:
+            return self._add_root(decision)
+
+        node = self.get_by_path(keys[:-1])
+
+        if not node:
+            return None, False
+
+        return self._insert(node, keys[-1], decision)
+
+    def _add_root(self, decision):
+        if self._root:
+            return self._root, False
+
+        self._root = _new_node(decision)
+        self._size = _subtree_size(self._root)
+        self._version += 1
+
+        return self._root, True
+
+    def _insert(self, node, key, decision):
+        if key in node.child_nodes:
+            return node.child_nodes[key], False
+
+        node.child_nodes[key] = _new_node(decision)
+        self._version += 1
+
+        if self._size is not None:
+            self._size += _subtree_size(node.child_nodes[key])
+
+        return node.child_nodes[key], True
+
+    def remove(self, keys):
+        return self._replace(tuple(keys), None)[1]
+
+    def replace(self, keys, decision):
+        return self._replace(tuple(keys), _new_node(decision))
+
+    def _replace(self, keys, node):
+        parent = self.get_by_path(keys[:-1]) if keys else None
+
+        if not self._root or keys and (
+                not parent or keys[-1] not in parent.child_nodes):
+            return None, False
+
+        replaced_node = parent.child_nodes[keys[-1]] if keys else self._root
+
+        if self._size is not None:
+            self._size += (_subtree_size(node) if node else 0) \
+                - _subtree_size(replaced_node)
+
+        if not keys:
+            self._root = node
+        elif node is None:
+            del parent.child_nodes[keys[-1]]
+        else:
+            parent.child_nodes[keys[-1]] = node
+
+        self._version += 1
+        self._detach(replaced_node)
+
+        return node, True
+
+    def _detach(self, node):
+        _release(node)
+
+
+class recursive_decision_tree(_base_decision_tree):
+    __slots__ = ()
+
+    def recount(self):
+        self._built = _built_nodes
+        self._size = _unfold(_count_step, (self._root,)) if self._root else 0
+
+        return self._size
+
+    def traversal(self, obj_status):
+        if not self._root:
+            return None
+
+        return _traversal_walk(self._root, obj_status)
+
+    def traversal_many(self, objs_status):
+        objs_status = list(objs_status)
+        leaf_decisions = [None] * len(objs_status)
+
+        if not self._root:
+            return leaf_decisions
+
+        _unfold(_traversal_many_step, (self._root, range(len(objs_status)),
+                                       objs_status, leaf_decisions, {}))
+
+        return leaf_decisions
+
+    def get(self, depth_level, obj_status):
+        if not self._root:
+            return None
+
+        return _get_walk(self._root, obj_status, depth_level)
+
+    def get_many(self, depth_level, objs_status):
+        objs_status = list(objs_status)
+        nodes = [None] * len(objs_status)
+
+        if not self._root:
+            return nodes
+
+        _unfold(_get_many_step, (self._root, 0, range(len(objs_status)),
+                                 depth_level, objs_status, nodes, {}))
+
+        return nodes
+
+    def get_by_path(self, keys):
+        if not self._root:
+            return None
+
+        return _path_walk(self._root, keys)
+
+    def prune(self, predicate):
+        if not self._root:
+            return 0
+
+        if predicate(self._root):
+            return int(self._replace((), None)[1])
+
+        pruned = []
+        _unfold(_prune_step, (self._root, predicate, pruned))
+
+        for node in pruned:
+            if self._size is not None:
+                self._size -= _subtree_size(node)
+
+            self._detach(node)
+
+        if pruned:
+            self._version += 1
+
+        return len(pruned)
+
+    def add(self, depth_level, obj_status, key, decision):
+        if not self._root:
+            if depth_level > 0:
+                return None, False
+
+            return self._add_root(decision)
+
+        if depth_level == 0:
+            return self._root, False
+
+        node = _get_walk(self._root, obj_status, depth_level - 1)
+
+        if not node:
+            return None, False
+
+        return self._insert(node, key, decision)
+
+
+class iterative_decision_tree(_base_decision_tree):
+    __slots__ = ("_leaf_cache", "_pool", "_statistics")
+
+    def __init__(self, root=None):
+        super().__init__(root)
+        self._leaf_cache = None
+        self._pool = None
+        self._statistics = None
+
+    def recount(self):
+        self._built = _built_nodes
+        size = 0
+        stack = [self._root] if self._root else []
+
+        while stack:
+            node = stack.pop()
+            size += 1
+
+            if node.child_nodes:
+                stack.extend(node.child_nodes.values())
+
+        self._size = size
+
+        return size
+
+    def enable_cache(self, maxsize=1024, key=None):
+        if key is not None:
+            self._leaf_cache = leaf_cache(key, maxsize)
+        else:
+            self._leaf_cache = leaf_cache(self._cache_key(), maxsize,
+                                          self._cache_key)
+            self._leaf_cache._version = self._version
+
+        return self._leaf_cache
+
+    def _cache_key(self):
+        attributes = set()
+        stack = [self._root] if self._root else []
+
+        while stack:
+            node = stack.pop()
+
+            if not node.child_nodes:
+                continue
+
+            if not hasattr(node.decision, "reads"):
+                raise ValueError(
+                    "decision %r does not declare the attributes it reads"
+                    % (node.decision,))
+
+            attributes.update(node.decision.reads)
+            stack.extend(node.child_nodes.values())
+
+        return attrgetter(*sorted(attributes)) if attributes \
+            else lambda obj_status: None
+
+    def disable_cache(self):
+        self._leaf_cache = None
+
+    def cache_info(self):
+        return self._leaf_cache.info() if self._leaf_cache else None
+
+    def enable_instrumentation(self):
+        self._statistics = node_statistics()
+
+        return self._statistics
+
+    def disable_instrumentation(self):
+        self._statistics = None
+
+    def instrumentation_snapshot(self):
+        if self._statistics is None:
+            return None
+
+        return self._statistics.snapshot(self._root)
+
+    def reset_instrumentation(self):
+        if self._statistics is not None:
+            self._statistics.reset()
+
+    def _detach(self, node):
+        if self._statistics is not None:
+            self._statistics.forget(node)
+
+        _release(node)
+
+    def traversal(self, obj_status):
+        if self._leaf_cache is None:
+            return self._traversal(obj_status)
+
+        return self._leaf_cache.traversal(self._traversal, obj_status,
+                                          self._version)
+
+    def _traversal(self, obj_status):
+        node = self._root
+
+        if not node:
+            return None
 
-    def __init__(self, decision):
-        self.decision = decision
-        self.child_nodes = {}
+        if self._statistics is not None:
+            node = self._statistics.descend(node, obj_status)
 
+            return node.decision if node else None
 
-class recursive_decision_tree:
-    __slots__ = ("_root")
+        memo = None
 
-    def __init__(self, root=None):
-        self._root = root
+        while True:
+            if not node.child_nodes:
+                return node.decision
 
-    def size(self):
-        if not self._root:
-            return 0
+            if not node.memoize:
+                child_key = node.decision(obj_status)
+            else:
+                if memo is None:
+                    memo = {}
 
-        def recursion(node):
-            all_child_nodes = 0
+                child_key = _memoized_decision(
+                    memo, node.decision, node.decision, obj_status)
 
-            if node.child_nodes:
-                all_child_nodes = len(node.child_nodes)
+            if child_key not in node.child_nodes:
+                return None
 
-                def nodes_traversal(nodes, pos, current):
-                    all_child_nodes = recursion(current)
+            node = node.child_nodes[child_key]
 
-                    if pos + 1 < len(nodes):
-                        all_child_nodes += nodes_traversal(
-                            nodes, pos + 1, nodes[pos + 1])
+    def traversal_many(self, objs_status):
+        objs_status = list(objs_status)
+        leaf_decisions = [None] * len(objs_status)
 
-                    return all_child_nodes
+        root = self._root
 
-                child_nodes_list = list(node.child_nodes.values())
+        if not root:
+            return leaf_decisions
 
-                all_child_nodes += nodes_traversal(
-                    child_nodes_list, 0, child_nodes_list[0])
+        memo = {}
+        stack = [(root, range(len(objs_status)))]
 
-            return all_child_nodes
+        while stack:
+            node, indexes = stack.pop()
 
-        return 1 + recursion(self._root)
+            if not node.child_nodes:
+                for index in indexes:
+                    leaf_decisions[index] = node.decision
 
-    def traversal(self, obj_status):
-        if not self._root:
-            return None
+                continue
+
+            partitions = _partition(node, objs_status, indexes, memo)
+
+            for child_key, child_indexes in partitions.items():
+                if child_key in node.child_nodes:
+                    stack.append((node.child_nodes[child_key], child_indexes))
+
+        return leaf_decisions
+
+    def traversal_vectorized(self, columns):
+        if np is None:
+            raise ImportError("traversal_vectorized requires numpy")
+
+        length = _batch_length(columns)
+        leaf_decisions = np.empty(length, dtype=object)
+
+        root = self._root
+
+        if not root or not length:
+            return leaf_decisions
+
+        stack = [(root, np.arange(length))]
+
+        while stack:
+            node, indexes = stack.pop()
 
-        def recursion(node):
             if not node.child_nodes:
-                return node.decision
+                leaf_decision = np.empty(1, dtype=object)
+                leaf_decision[0] = node.decision
+                leaf_decisions[indexes] = leaf_decision
 
-            child_key = node.decision(obj_status)
+                continue
 
-            if child_key not in node.child_nodes:
-                return None
+            partitions = _vectorized_partition(
+                node, columns, indexes, len(indexes) == length)
+
+            for child_key, child_indexes in partitions.items():
+                if child_key in node.child_nodes:
+                    stack.append((node.child_nodes[child_key], child_indexes))
 
-            return recursion(node.child_nodes[child_key])
+        return leaf_decisions
 
-        return recursion(self._root)
+    def parallel_traversal(self, objs_status, workers=None, chunksize=1024):
+        root = self._root
+        pool = self._pool
+
+        if pool is None or pool.workers != workers or pool.root is not root \
+           or pool.version != self._version:
+            self.close_pool()
+            pool = self._pool = _parallel_pool(root, workers, self._version)
+
+        objs_status = iter(objs_status)
+        chunks = iter(lambda: list(islice(objs_status, chunksize)), [])
+        leaf_decisions = []
+
+        for chunk_leaf_decisions in pool.executor.map(
+                _parallel_traversal_chunk, chunks):
+            leaf_decisions.extend(chunk_leaf_decisions)
+
+        return leaf_decisions
+
+    def close_pool(self):
+        if self._pool is not None:
+            self._pool.executor.shutdown()
+            self._pool = None
 
     def get(self, depth_level, obj_status):
-        if not self._root:
+        node = self._root
+
+        if not node:
             return None
 
-        def recursion(node, current_depth):
+        if self._statistics is not None:
+            return self._statistics.descend(node, obj_status, depth_level)
+
+        memo = None
+        current_depth = 0
+
+        while True:
             if current_depth >= depth_level:
                 return node
 
             if not node.child_nodes:
                 return None
 
-            child_key = node.decision(obj_status)
+            if not node.memoize:
+                child_key = node.decision(obj_status)
+            else:
+                if memo is None:
+                    memo = {}
+
+                child_key = _memoized_decision(
+                    memo, node.decision, node.decision, obj_status)
 
             if child_key not in node.child_nodes:
                 return None
 
-            return recursion(node.child_nodes[child_key], current_depth + 1)
+            node = node.child_nodes[child_key]
+            current_depth += 1
+
+    def get_many(self, depth_level, objs_status):
+        objs_status = list(objs_status)
+        nodes = [None] * len(objs_status)
+
+        root = self._root
+
+        if not root:
+            return nodes
+
+        memo = {}
+        stack = [(root, 0, range(len(objs_status)))]
+
+        while stack:
+            node, current_depth, indexes = stack.pop()
+
+            if current_depth >= depth_level:
+                for index in indexes:
+                    nodes[index] = node
+
+                continue
+
+            if not node.child_nodes:
+                continue
+
+            partitions = _partition(node, objs_status, indexes, memo)
+
+            for child_key, child_indexes in partitions.items():
+                if child_key in node.child_nodes:
+                    stack.append((node.child_nodes[child_key],
+                                  current_depth + 1,
+                                  child_indexes))
+
+        return nodes
+
+    def get_by_path(self, keys):
+        node = self._root
+
+        if not node:
+            return None
+
+        for key in keys:
+            if key not in node.child_nodes:
+                return None
+
+            node = node.child_nodes[key]
+
+        return node
+
+    def prune(self, predicate):
+        if not self._root:
+            return 0
+
+        if predicate(self._root):
+            return int(self._replace((), None)[1])
+
+        pruned = []
+        stack = [self._root]
+
+        while stack:
+            node = stack.pop()
+
+            for child_key, child_node in list(node.child_nodes.items()):
+                if predicate(child_node):
+                    del node.child_nodes[child_key]
+                    pruned.append(child_node)
+                else:
+                    stack.append(child_node)
+
+        for node in pruned:
+            if self._size is not None:
+                self._size -= _subtree_size(node)
+
+            self._detach(node)
+
+        if pruned:
+            self._version += 1
 
-        return recursion(self._root, 0)
+        return len(pruned)
 
     def add(self, depth_level, obj_status, key, decision):
         if not self._root:
             if depth_level > 0:
                 return None, False
 
-            self._root = tree_node(decision)
-
-            return self._root, True
+            return self._add_root(decision)
 
         if depth_level == 0:
             return self._root, False
 
-        def recursion(node, current_depth):
-            if current_depth + 1 == depth_level:
-                if key not in node.child_nodes:
-                    node.child_nodes[key] = tree_node(decision)
-                    inserted = True
-                else:
-                    inserted = False
+        if self._statistics is not None:
+            node = self._statistics.descend(
+                self._root, obj_status, depth_level - 1)
+
+            return self._insert(node, key, decision) if node else (None, False)
 
-                return node.child_nodes[key], inserted
+        memo = None
+        current_depth = 0
+        node = self._root
+
+        while True:
+            if current_depth + 1 == depth_level:
+                return self._insert(node, key, decision)
 
             if not node.child_nodes:
                 return None, False
 
-            child_key = node.decision(obj_status)
+            if not node.memoize:
+                child_key = node.decision(obj_status)
+            else:
+                if memo is None:
+                    memo = {}
+
+                child_key = _memoized_decision(
+                    memo, node.decision, node.decision, obj_status)
 
             if child_key not in node.child_nodes:
                 return None, False
 
-            return recursion(node.child_nodes[child_key], current_depth + 1)
-
-        return recursion(self._root, 0)
+            node = node.child_nodes[child_key]
+            current_depth += 1
 
 
-class iterative_decision_tree:
-    __slots__ = ("_root")
+class concurrent_decision_tree(iterative_decision_tree):
+    __slots__ = ("_write_lock",)
 
     def __init__(self, root=None):
+        super().__init__(root)
+        self._write_lock = Lock()
+
+    def snapshot(self):
+        return iterative_decision_tree(self._root)
+
+    def _swap_root(self, root, size_delta):
         self._root = root
+        self._version += 1
 
-    def size(self):
-        if not self._root:
-            return 0
+        if self._size is not None:
+            self._size += size_delta
 
-        size = 1
-        stack = Queue()
-        node = self._root
+    def add(self, depth_level, obj_status, key, decision):
+        with self._write_lock:
+            root = self._root
 
-        while True:
-            if node.child_nodes:
-                size += len(node.child_nodes)
+            if not root:
+                if depth_level > 0:
+                    return None, False
 
-                for child_node in reversed(list(node.child_nodes.values())):
-                    stack.put_nowait(child_node)
+                return self._add_root(decision)
 
-            if stack.empty():
-                return size
+            if depth_level == 0:
+                return root, False
 
-            node = stack.get_nowait()
+            memo = None
+            path = []
+            node = root
 
-    def traversal(self, obj_status):
+            while len(path) + 1 < depth_level:
+                if not node.child_nodes:
+                    return None, False
+
+                if not node.memoize:
+                    child_key = node.decision(obj_status)
+                else:
+                    if memo is None:
+                        memo = {}
+
+                    child_key = _memoized_decision(
+                        memo, node.decision, node.decision, obj_status)
+
+                if child_key not in node.child_nodes:
+                    return None, False
+
+                path.append((node, child_key))
+                node = node.child_nodes[child_key]
+
+            return self._insert_at(path, node, key, decision)
+
+    def add_by_path(self, keys, decision):
+        keys = tuple(keys)
+
+        with self._write_lock:
+            if not keys:
+                return self._add_root(decision)
+
+            node = self._root
+            path = []
+
+            for key in keys[:-1]:
+                if not node or key not in node.child_nodes:
+                    return None, False
+
+                path.append((node, key))
+                node = node.child_nodes[key]
+
+            if not node:
+                return None, False
+
+            return self._insert_at(path, node, keys[-1], decision)
+
+    def _insert_at(self, path, node, key, decision):
+        if key in node.child_nodes:
+            return node.child_nodes[key], False
+
+        inserted_node = _new_node(decision)
+        self._swap_root(_copy_path(path + [(node, key)], inserted_node),
+                        _subtree_size(inserted_node))
+
+        return inserted_node, True
+
+    def _replace(self, keys, node):
+        with self._write_lock:
+            parent = self._root
+            path = []
+
+            for key in keys[:-1]:
+                if not parent or key not in parent.child_nodes:
+                    return None, False
+
+                path.append((parent, key))
+                parent = parent.child_nodes[key]
+
+            if not parent or keys and keys[-1] not in parent.child_nodes:
+                return None, False
+
+            size_delta = 0
+
+            if self._size is not None:
+                size_delta = (_subtree_size(node) if node else 0) \
+                    - _subtree_size(parent.child_nodes[keys[-1]]
+                                    if keys else parent)
+
+            if not keys:
+                root = node
+            elif node is None:
+                copied_parent = _copy_node(parent)
+                del copied_parent.child_nodes[keys[-1]]
+                root = _copy_path(path, copied_parent)
+            else:
+                root = _copy_path(path + [(parent, keys[-1])], node)
+
+            self._swap_root(root, size_delta)
+
+            return node, True
+
+    def prune(self, predicate):
+        with self._write_lock:
+            root = self._root
+
+            if not root:
+                return 0
+
+            size_valid = self._size is not None
+
+            if predicate(root):
+                self._swap_root(None, -_subtree_size(root) if size_valid
+                                else 0)
+
+                return 1
+
+            pruned_paths = []
+            stack = [((), root)]
+
+            while stack:
+                path, node = stack.pop()
+
+                for child_key, child_node in node.child_nodes.items():
+                    if predicate(child_node):
+                        pruned_paths.append(path + (child_key,))
+                    else:
+                        stack.append((path + (child_key,), child_node))
+
+            if not pruned_paths:
+                return 0
+
+            copied_root = _copy_node(root)
+            copied_nodes = {() : copied_root}
+            size_delta = 0
+
+            for path in pruned_paths:
+                node = root
+                copied_node = copied_root
+
+                for pos, child_key in enumerate(path[:-1]):
+                    node = node.child_nodes[child_key]
+
+                    if path[:pos + 1] not in copied_nodes:
+                        copied_nodes[path[:pos + 1]] = _copy_node(node)
+                        copied_node.child_nodes[child_key] = \
+                            copied_nodes[path[:pos + 1]]
+
+                    copied_node = copied_nodes[path[:pos + 1]]
+
+                if size_valid:
+                    size_delta -= _subtree_size(node.child_nodes[path[-1]])
+
+                del copied_node.child_nodes[path[-1]]
+
+            self._swap_root(copied_root, size_delta)
+
+            return len(pruned_paths)
+
+
+class async_decision_tree(_base_decision_tree):
+    __slots__ = ()
+
+    def recount(self):
+        self._built = _built_nodes
+        self._size = _unfold(_count_step, (self._root,)) if self._root else 0
+
+        return self._size
+
+    def get_by_path(self, keys):
         if not self._root:
             return None
 
+        return _path_walk(self._root, keys)
+
+    def _sync_walk(self, *args, **kwargs):
+        raise TypeError("async_decision_tree is walked with async_traversal, "
+                        "async_traversal_many and async_get")
+
+    compile = optimize = traversal_stream = _sync_walk
+
+    async def async_traversal(self, obj_status):
         node = self._root
 
+        if not node:
+            return None
+
+        memo = {}
+
         while True:
             if not node.child_nodes:
                 return node.decision
 
-            child_key = node.decision(obj_status)
+            child_key = await _async_decision(node, obj_status, memo)
 
             if child_key not in node.child_nodes:
                 return None
 
             node = node.child_nodes[child_key]
 
-    def get(self, depth_level, obj_status):
-        if not self._root:
+    async def async_traversal_many(self, objs_status, limit=None):
+        if limit is None:
+            return list(await asyncio.gather(
+                *(self.async_traversal(obj_status)
+                  for obj_status in objs_status)))
+
+        semaphore = asyncio.Semaphore(limit)
+
+        async def limited_traversal(obj_status):
+            async with semaphore:
+                return await self.async_traversal(obj_status)
+
+        return list(await asyncio.gather(
+            *(limited_traversal(obj_status) for obj_status in objs_status)))
+
+    async def async_get(self, depth_level, obj_status):
+        node = self._root
+
+        if not node:
             return None
 
+        memo = {}
         current_depth = 0
-        node = self._root
 
         while True:
             if current_depth >= depth_level:
@@ -171,7 +2609,7 @@ class iterative_decision_tree:
             if not node.child_nodes:
                 return None
 
-            child_key = node.decision(obj_status)
+            child_key = await _async_decision(node, obj_status, memo)
 
             if child_key not in node.child_nodes:
                 return None
@@ -179,38 +2617,367 @@ class iterative_decision_tree:
             node = node.child_nodes[child_key]
             current_depth += 1
 
-    def add(self, depth_level, obj_status, key, decision):
+    async def async_add(self, depth_level, obj_status, key, decision):
         if not self._root:
             if depth_level > 0:
                 return None, False
 
-            self._root = tree_node(decision)
-
-            return self._root, True
+            return self._add_root(decision)
 
         if depth_level == 0:
             return self._root, False
 
+        memo = {}
         current_depth = 0
         node = self._root
 
         while True:
             if current_depth + 1 == depth_level:
-                if key not in node.child_nodes:
-                    node.child_nodes[key] = tree_node(decision)
-                    inserted = True
-                else:
-                    inserted = False
-
-                return node.child_nodes[key], inserted
+                return self._insert(node, key, decision)
 
             if not node.child_nodes:
                 return None, False
 
-            child_key = node.decision(obj_status)
+            child_key = await _async_decision(node, obj_status, memo)
 
             if child_key not in node.child_nodes:
                 return None, False
 
             node = node.child_nodes[child_key]
             current_depth += 1
+
+
+forest_metrics = namedtuple(
+    "forest_metrics", ("batches", "rows", "tree_rows", "seconds",
+                       "rows_per_second", "tree_rows_per_second"))
+
+_FOREST_AGGREGATES = ("vote", "mean")
+
+
+def _flat_nodes(root):
+    if not root:
+        return None
+
+    nodes = [root]
+    pos = 0
+
+    while pos < len(nodes):
+        node = nodes[pos]
+        decision = node.decision
+        pos += 1
+
+        if node.vectorized_decision is not None:
+            return None
+
+        if not node.child_nodes:
+            if not isinstance(decision, constant_leaf):
+                return None
+
+            continue
+
+        if not isinstance(decision, threshold_split) or not all(
+                isinstance(threshold, Real)
+                for threshold in decision.thresholds) \
+           or not set(node.child_nodes) <= set(decision.keys()):
+            return None
+
+        nodes.extend(node.child_nodes.values())
+
+    return nodes
+
+
+class _forest_layout:
+    __slots__ = ("attributes", "routing", "flat_trees", "other_trees",
+                 "roots", "values", "_value_ids")
+
+    def __init__(self, trees):
+        self.roots = tuple(main_tree._root for main_tree in trees)
+        self.values = []
+        self._value_ids = {}
+        self.flat_trees = []
+        self.other_trees = []
+        attribute_ids = {}
+        features = []
+        thresholds = []
+        children = []
+        leaf_values = []
+        roots = []
+        depth = 0
+
+        for tree_index, root in enumerate(self.roots):
+            nodes = _flat_nodes(root)
+
+            if nodes is None:
+                self.other_trees.append(tree_index)
+
+                continue
+
+            offset = len(features)
+            positions = {
+                id(node) : offset + pos for pos, node in enumerate(nodes)
+            }
+            depths = {id(root) : 0}
+
+            for node in nodes:
+                decision = node.decision
+                node_depth = depths[id(node)]
+                depth = max(depth, node_depth)
+
+                if not node.child_nodes:
+                    features.append(0)
+                    thresholds.append(())
+                    children.append((positions[id(node)],))
+                    leaf_values.append(self.value_id(decision.value))
+
+                    continue
+
+                for child_node in node.child_nodes.values():
+                    depths[id(child_node)] = node_depth + 1
+
+                features.append(attribute_ids.setdefault(
+                    decision.attribute, len(attribute_ids)))
+                thresholds.append(decision.thresholds)
+                children.append(tuple(
+                    positions[id(node.child_nodes[key])]
+                    if key in node.child_nodes else -1
+                    for key in decision.keys()))
+                leaf_values.append(-1)
+
+            roots.append(offset)
+            self.flat_trees.append(tree_index)
+
+        missing = len(features)
+        width = max(map(len, thresholds), default=0)
+        threshold_array = np.full((missing + 1, max(width, 1)), np.nan)
+        child_array = np.full((missing + 1, max(width, 1) + 1), missing,
+                              dtype=np.intp)
+
+        for index, (node_thresholds, node_children) in enumerate(
+                zip(thresholds, children)):
+            threshold_array[index, :len(node_thresholds)] = node_thresholds
+
+            if len(node_children) == 1:
+                child_array[index] = node_children[0]
+            else:
+                child_array[index, :len(node_children)] = node_children
+
+        child_array[child_array < 0] = missing
+        self.attributes = tuple(attribute_ids)
+        self.routing = (np.array(features + [0], dtype=np.intp),
+                        threshold_array, child_array,
+                        np.array(leaf_values + [-1], dtype=np.intp),
+                        np.array(roots, dtype=np.intp), depth)
+
+    def value_id(self, value):
+        if value not in self._value_ids:
+            self._value_ids[value] = len(self.values)
+            self.values.append(value)
+
+        return self._value_ids[value]
+
+    def matrix(self, batch, start, stop):
+        matrix = np.empty((len(self.attributes), stop - start))
+
+        for index, attribute in enumerate(self.attributes):
+            if isinstance(batch, dict):
+                matrix[index] = batch[attribute][start:stop]
+            else:
+                matrix[index] = [getattr(obj_status, attribute)
+                                 for obj_status in batch[start:stop]]
+
+        return matrix
+
+
+def _forest_leaf_ids(features, thresholds, children, leaf_values, roots,
+                     depth, matrix):
+    rows = matrix.shape[1]
+    values = matrix.ravel()
+    offsets = features * rows
+    nodes = np.repeat(roots, rows)
+    row_indexes = np.tile(np.arange(rows), len(roots))
+
+    if thresholds.shape[1] == 1:
+        split_values = thresholds[:, 0]
+        left_nodes = children[:, 0].copy()
+        right_nodes = children[:, 1].copy()
+
+        for _ in range(depth):
+            nodes = np.where(
+                values[offsets[nodes] + row_indexes] < split_values[nodes],
+                left_nodes[nodes], right_nodes[nodes])
+    else:
+        widths = np.count_nonzero(~np.isnan(thresholds), axis=1)
+
+        for _ in range(depth):
+            below = values[offsets[nodes] + row_indexes, None] \
+                < thresholds[nodes]
+            nodes = children[nodes, widths[nodes] - below.sum(axis=1)]
+
+    return leaf_values[nodes].reshape(len(roots), rows)
+
+
+_worker_forest_routing = None
+
+
+def _forest_initializer(routing):
+    global _worker_forest_routing
+
+    _worker_forest_routing = routing
+
+
+def _forest_chunk(matrix):
+    return _forest_leaf_ids(*_worker_forest_routing, matrix)
+
+
+class decision_forest:
+    __slots__ = ("trees", "aggregate", "_layout", "_layout_versions",
+                 "_pool", "_batches", "_rows", "_tree_rows", "_seconds")
+
+    def __init__(self, trees=(), aggregate="vote"):
+        if aggregate not in _FOREST_AGGREGATES:
+            raise ValueError("unknown forest aggregate %r" % (aggregate,))
+
+        self.trees = list(trees)
+        self.aggregate = aggregate
+        self._layout = None
+        self._layout_versions = None
+        self._pool = None
+        self.reset_metrics()
+
+    def __len__(self):
+        return len(self.trees)
+
+    def __iter__(self):
+        return iter(self.trees)
+
+    def add(self, main_tree):
+        self.trees.append(main_tree)
+
+    def _current_layout(self):
+        versions = [(main_tree._root, main_tree._version)
+                    for main_tree in self.trees]
+
+        if self._layout is None or self._layout_versions != versions:
+            self._layout = _forest_layout(self.trees)
+            self._layout_versions = versions
+
+        return self._layout
+
+    def _flat_leaf_ids(self, layout, batch, length, workers, chunksize):
+        bounds = [(start, min(start + chunksize, length))
+                  for start in range(0, length, chunksize)]
+        matrices = (layout.matrix(batch, start, stop)
+                    for start, stop in bounds)
+
+        if workers == 1:
+            chunks = [_forest_leaf_ids(*layout.routing, matrix)
+                      for matrix in matrices]
+        else:
+            pool = self._pool
+
+            if pool is None or pool[1] != workers or pool[2] is not layout:
+                self.close_pool()
+                pool = self._pool = (ProcessPoolExecutor(
+                    max_workers=workers, initializer=_forest_initializer,
+                    initargs=(layout.routing,)), workers, layout)
+
+            chunks = list(pool[0].map(_forest_chunk, matrices))
+
+        return np.concatenate(chunks, axis=1)
+
+    def _leaf_ids(self, batch, workers, chunksize):
+        if np is None:
+            raise ImportError("decision_forest requires numpy")
+
+        if chunksize < 1:
+            raise ValueError("chunksize must be >= 1")
+
+        start = perf_counter()
+        layout = self._current_layout()
+        length = _batch_length(batch)
+        leaf_ids = np.full((len(self.trees), length), -1, dtype=np.intp)
+
+        if length and layout.flat_trees:
+            leaf_ids[layout.flat_trees] = self._flat_leaf_ids(
+                layout, batch, length, workers, chunksize)
+
+        for tree_index in layout.other_trees if length else ():
+            main_tree = iterative_decision_tree(layout.roots[tree_index])
+
+            if isinstance(batch, dict):
+                leaf_decisions = main_tree.traversal_vectorized(batch)
+            else:
+                leaf_decisions = main_tree.traversal_many(batch)
+
+            leaf_ids[tree_index] = [
+                -1 if leaf_decision is None
+                else layout.value_id(leaf_decision())
+                for leaf_decision in leaf_decisions]
+
+        self._batches += 1
+        self._rows += length
+        self._tree_rows += length * len(self.trees)
+        self._seconds += perf_counter() - start
+
+        return leaf_ids, layout.values
+
+    def leaf_values(self, batch, workers=1, chunksize=8192):
+        leaf_ids, values = self._leaf_ids(batch, workers, chunksize)
+        value_table = np.empty(len(values) + 1, dtype=object)
+
+        for index, value in enumerate(values):
+            value_table[index] = value
+
+        return value_table[leaf_ids]
+
+    def predict(self, batch, workers=1, chunksize=8192):
+        leaf_ids, values = self._leaf_ids(batch, workers, chunksize)
+        length = leaf_ids.shape[1]
+
+        if self.aggregate == "mean":
+            value_table = np.append(np.asarray(values, dtype=np.float64), 0.0)
+            reached = leaf_ids >= 0
+            counts = reached.sum(axis=0)
+            totals = value_table[leaf_ids].sum(axis=0, where=reached)
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return np.where(counts > 0, totals / np.maximum(counts, 1),
+                                np.nan)
+
+        predictions = np.empty(length, dtype=object)
+
+        if not values or not length:
+            return predictions
+
+        reached = leaf_ids >= 0
+        cells = (leaf_ids + np.arange(length) * len(values))[reached]
+        counts = np.bincount(cells, minlength=length * len(values)).reshape(
+            length, len(values))
+        value_table = np.empty(len(values), dtype=object)
+
+        for index, value in enumerate(values):
+            value_table[index] = value
+
+        predictions[:] = value_table[counts.argmax(axis=1)]
+        predictions[~reached.any(axis=0)] = None
+
+        return predictions
+
+    def metrics(self):
+        seconds = self._seconds
+
+        return forest_metrics(
+            self._batches, self._rows, self._tree_rows, seconds,
+            self._rows / seconds if seconds else 0.0,
+            self._tree_rows / seconds if seconds else 0.0)
+
+    def reset_metrics(self):
+        self._batches = 0
+        self._rows = 0
+        self._tree_rows = 0
+        self._seconds = 0.0
+
+    def close_pool(self):
+        if self._pool is not None:
+            self._pool[0].shutdown()
+            self._pool = None
@@ -0,0 +1,931 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from itertools import islice
+from multiprocessing import shared_memory
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from decision_tree import iterative_decision_tree, threshold_split, \
+    constant_leaf, decision_forest, _make_node
+
+CRITERIA = ("gini", "entropy", "variance")
+EDGE_SAMPLE_ROWS = 200000
+CHUNK_CELLS = 1 << 22
+MIN_PARALLEL_ROWS = 10000
+CHUNK_ROWS = 65536
+MAX_HISTOGRAM_BYTES = 1 << 28
+
+
+def _feature_names(feature_names, feature_count):
+    if feature_names is None:
+        return tuple("x%d" % feature for feature in range(feature_count))
+
+    feature_names = tuple(feature_names)
+
+    if len(feature_names) != feature_count:
+        raise ValueError("expected %d feature names, got %d"
+                         % (feature_count, len(feature_names)))
+
+    return feature_names
+
+
+class _training_data:
+    __slots__ = ("features", "binned", "targets", "order", "edges",
+                 "classes", "feature_names")
+
+    def __init__(self, features, binned, targets, order, edges, classes,
+                 feature_names):
+        self.features = features
+        self.binned = binned
+        self.targets = targets
+        self.order = order
+        self.edges = edges
+        self.classes = classes
+        self.feature_names = feature_names
+
+
+def _column_edges(values, max_bins):
+    values = np.unique(values)
+
+    if len(values) > max_bins:
+        return np.unique(np.quantile(
+            values, np.linspace(0, 1, max_bins + 1)[1:-1], method="lower"))
+
+    return values[1:]
+
+
+def _bin_column(column, edges):
+    column = np.ascontiguousarray(column)
+
+    if column.dtype.kind == "f":
+        edges = edges.astype(column.dtype, copy=False)
+
+    return np.searchsorted(edges, column, side="right")
+
+
+def _bin_columns(data, max_bins, feature_start, feature_stop, seed=0):
+    features = data.features
+    sample = features[:, feature_start:feature_stop]
+
+    if len(features) > EDGE_SAMPLE_ROWS:
+        rows = np.random.default_rng(seed).choice(
+            len(features), EDGE_SAMPLE_ROWS, replace=False)
+        sample = sample[np.sort(rows)]
+
+    for feature in range(feature_start, feature_stop):
+        values = _column_edges(sample[:, feature - feature_start], max_bins)
+        edges = data.edges[feature]
+        edges[:] = np.inf
+        edges[:len(values)] = values
+        data.binned[:, feature] = _bin_column(features[:, feature], edges)
+
+
+def _histogram(data, criterion, start, end, feature_start=0,
+               feature_stop=None):
+    if feature_stop is None:
+        feature_stop = data.binned.shape[1]
+
+    feature_count = feature_stop - feature_start
+    bin_count = data.edges.shape[1] + 1
+    indexes = data.order[start:end]
+    offsets = np.arange(feature_count) * bin_count
+    step = max(1, CHUNK_CELLS // max(feature_count, 1))
+
+    if criterion == "variance":
+        cells_count = feature_count * bin_count
+        histogram = np.zeros((3, cells_count))
+
+        for chunk in range(0, len(indexes), step):
+            rows = indexes[chunk:chunk + step]
+            cells = (data.binned[rows, feature_start:feature_stop]
+                     + offsets).ravel()
+            values = np.repeat(data.targets[rows], feature_count)
+            histogram[0] += np.bincount(cells, minlength=cells_count)
+            histogram[1] += np.bincount(cells, values, cells_count)
+            histogram[2] += np.bincount(cells, values * values, cells_count)
+
+        return histogram.T.reshape(feature_count, bin_count, 3)
+
+    class_count = len(data.classes)
+    cells_count = feature_count * bin_count * class_count
+    histogram = np.zeros(cells_count)
+
+    for chunk in range(0, len(indexes), step):
+        rows = indexes[chunk:chunk + step]
+        cells = (data.binned[rows, feature_start:feature_stop] + offsets) \
+            * class_count + data.targets[rows, None]
+        histogram += np.bincount(cells.ravel(), minlength=cells_count)
+
+    return histogram.reshape(feature_count, bin_count, class_count)
+
+
+def _xlogx(values):
+    return values * np.log(np.where(values > 0, values, 1))
+
+
+def _impurity(stats, criterion):
+    if criterion == "variance":
+        count = stats[..., 0]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            impurity = stats[..., 2] - np.where(
+                count > 0, stats[..., 1] ** 2 / count, 0)
+
+        return count, impurity
+
+    count = stats.sum(axis=-1)
+
+    if criterion == "entropy":
+        return count, _xlogx(count) - _xlogx(stats).sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        impurity = count - np.where(
+            count > 0, (stats * stats).sum(axis=-1) / count, 0)
+
+    return count, impurity
+
+
+def _best_split(histogram, criterion, min_samples_leaf):
+    left = np.cumsum(histogram, axis=1)[:, :-1]
+    total = histogram[0].sum(axis=0)
+    right = total - left
+    left_count, left_impurity = _impurity(left, criterion)
+    right_count, right_impurity = _impurity(right, criterion)
+    score = np.where(
+        (left_count >= min_samples_leaf) & (right_count >= min_samples_leaf),
+        left_impurity + right_impurity, np.inf)
+
+    if not score.size:
+        return None
+
+    best = np.argmin(score)
+    feature, bin_index = np.unravel_index(best, score.shape)
+
+    if not np.isfinite(score[feature, bin_index]):
+        return None
+
+    gain = _impurity(total, criterion)[1] - score[feature, bin_index]
+
+    return (int(feature), int(bin_index), float(gain),
+            left[feature, bin_index], right[feature, bin_index])
+
+
+def _leaf_value(stats, criterion, classes):
+    if criterion == "variance":
+        return float(stats[1] / stats[0]) if stats[0] else 0.0
+
+    value = classes[int(np.argmax(stats))]
+
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _splittable(stats, criterion, depth, learner):
+    if learner.max_depth is not None and depth >= learner.max_depth:
+        return False
+
+    count, impurity = _impurity(stats, criterion)
+
+    return count >= learner.min_samples_split and impurity > 1e-12
+
+
+def _partition(data, start, end, feature, bin_index):
+    rows = data.order[start:end]
+    goes_left = data.binned[rows, feature] <= bin_index
+    left_rows = rows[goes_left]
+    right_rows = rows[~goes_left]
+    middle = start + len(left_rows)
+    data.order[start:middle] = left_rows
+    data.order[middle:end] = right_rows
+
+    return middle
+
+
+def _split_node(learner, data, node, start, end, histogram, stats, depth,
+                sample_features=None):
+    split = None
+
+    if histogram is not None and sample_features is not None:
+        features = sample_features()
+        split = _best_split(histogram[features], learner.criterion,
+                            learner.min_samples_leaf)
+
+        if split is not None:
+            split = (int(features[split[0]]),) + split[1:]
+    elif histogram is not None:
+        split = _best_split(histogram, learner.criterion,
+                            learner.min_samples_leaf)
+
+    if split is None or split[2] <= max(
+            1e-12, learner.min_impurity_decrease * len(data.targets)):
+        node.decision = constant_leaf(
+            _leaf_value(stats, learner.criterion, data.classes))
+
+        return ()
+
+    feature, bin_index, _, left_stats, right_stats = split
+    node.decision = threshold_split(
+        data.feature_names[feature],
+        (data.edges[feature, bin_index].item(),))
+    middle = _partition(data, start, end, feature, bin_index)
+    children = ((_make_node(None), start, middle, left_stats, depth + 1),
+                (_make_node(None), middle, end, right_stats, depth + 1))
+
+    for child_key, child in enumerate(children):
+        node.child_nodes[child_key] = child[0]
+
+    return children
+
+
+def _child_histograms(learner, histogram, children, build):
+    growing = [pos for pos, child in enumerate(children)
+               if _splittable(child[3], learner.criterion, child[4], learner)]
+    histograms = [None, None]
+
+    if len(growing) == 2:
+        smaller = min(growing,
+                      key=lambda pos: children[pos][2] - children[pos][1])
+        larger = 1 - smaller
+        histograms[smaller] = build(children[smaller][1],
+                                    children[smaller][2])
+
+        if histograms[smaller] is not None:
+            histograms[larger] = histogram - histograms[smaller]
+        else:
+            histograms[larger] = build(children[larger][1],
+                                       children[larger][2])
+    elif growing:
+        histograms[growing[0]] = build(children[growing[0]][1],
+                                       children[growing[0]][2])
+
+    return histograms
+
+
+def _grow(learner, data, start, end, depth, sample_features=None):
+    def build(start, end):
+        return _histogram(data, learner.criterion, start, end)
+
+    root = _make_node(None)
+    histogram = build(start, end)
+    stats = histogram[0].sum(axis=0)
+
+    if not _splittable(stats, learner.criterion, depth, learner):
+        histogram = None
+
+    stack = [(root, start, end, histogram, stats, depth)]
+
+    while stack:
+        node, start, end, histogram, stats, depth = stack.pop()
+        children = _split_node(learner, data, node, start, end, histogram,
+                               stats, depth, sample_features)
+
+        for child, child_histogram in zip(children, _child_histograms(
+                learner, histogram, children, build) if children else ()):
+            stack.append((child[0], child[1], child[2], child_histogram,
+                          child[3], child[4]))
+
+    return root
+
+
+_worker_state = None
+
+
+def _shared_array(array, buffers):
+    memory = shared_memory.SharedMemory(create=True,
+                                        size=max(1, array.nbytes))
+    buffers.append(memory)
+    shared = np.ndarray(array.shape, array.dtype, memory.buf)
+    shared[...] = array
+
+    return shared, (memory.name, array.shape, array.dtype.str)
+
+
+def _attach_array(layout, buffers):
+    name, shape, dtype = layout
+    memory = shared_memory.SharedMemory(name=name)
+    buffers.append(memory)
+
+    return np.ndarray(shape, dtype, memory.buf)
+
+
+def _training_initializer(learner, layouts, classes, feature_names):
+    global _worker_state
+
+    buffers = []
+    arrays = [None if layout is None else _attach_array(layout, buffers)
+              for layout in layouts]
+    _worker_state = (learner, _training_data(*arrays, classes,
+                                             feature_names), buffers)
+
+
+def _bin_task(feature_start, feature_stop):
+    learner, data, _ = _worker_state
+    _bin_columns(data, learner.max_bins, feature_start, feature_stop)
+
+
+def _histogram_task(start, end, feature_start, feature_stop):
+    learner, data, _ = _worker_state
+
+    return _histogram(data, learner.criterion, start, end, feature_start,
+                      feature_stop)
+
+
+def _subtree_task(start, end, depth):
+    learner, data, _ = _worker_state
+
+    return _grow(learner, data, start, end, depth)
+
+
+def _forest_tree(learner, data, index):
+    rng = np.random.default_rng((learner.seed, index))
+    row_count, feature_count = data.binned.shape
+    rows = rng.integers(0, row_count, row_count) if learner.bootstrap \
+        else np.arange(row_count)
+    sample_count = learner.feature_count(feature_count)
+    sample_features = None
+
+    if sample_count < feature_count:
+        def sample_features():
+            return np.sort(rng.choice(feature_count, sample_count,
+                                      replace=False))
+
+    tree_data = _training_data(None, data.binned, data.targets, rows,
+                               data.edges, data.classes, data.feature_names)
+
+    return _grow(learner, tree_data, 0, row_count, 0, sample_features)
+
+
+def _forest_task(index):
+    learner, data, _ = _worker_state
+
+    return _forest_tree(learner, data, index)
+
+
+def _feature_groups(feature_count, group_count):
+    bounds = np.linspace(0, feature_count, min(group_count, feature_count)
+                         + 1, dtype=int).tolist()
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _grow_parallel(learner, data, pool, workers, parallel_rows):
+    feature_groups = _feature_groups(data.binned.shape[1], workers)
+
+    def build(start, end):
+        if end - start < parallel_rows:
+            return None
+
+        return np.concatenate(list(pool.map(
+            _histogram_task,
+            *zip(*[(start, end) + group for group in feature_groups]))))
+
+    root = _make_node(None)
+    stack = [(root, 0, len(data.targets), None, None, 0)]
+    subtrees = []
+
+    while stack:
+        node, start, end, histogram, stats, depth = stack.pop()
+
+        if histogram is None and stats is not None \
+           and not _splittable(stats, learner.criterion, depth, learner):
+            _split_node(learner, data, node, start, end, None, stats, depth)
+
+            continue
+
+        if end - start < parallel_rows:
+            subtrees.append(
+                (node, pool.submit(_subtree_task, start, end, depth)))
+
+            continue
+
+        if histogram is None:
+            histogram = build(start, end)
+            stats = histogram[0].sum(axis=0)
+
+            if not _splittable(stats, learner.criterion, depth, learner):
+                histogram = None
+
+        children = _split_node(learner, data, node, start, end, histogram,
+                               stats, depth)
+
+        for child, child_histogram in zip(children, _child_histograms(
+                learner, histogram, children, build) if children else ()):
+            stack.append((child[0], child[1], child[2], child_histogram,
+                          child[3], child[4]))
+
+    for node, future in subtrees:
+        subtree = future.result()
+        node.decision = subtree.decision
+        node.child_nodes = subtree.child_nodes
+
+    return root
+
+
+class array_source:
+    __slots__ = ("features", "labels", "chunk_rows", "feature_names")
+
+    def __init__(self, features, labels, chunk_rows=CHUNK_ROWS,
+                 feature_names=None):
+        self.features = features
+        self.labels = labels
+        self.chunk_rows = chunk_rows
+        self.feature_names = feature_names
+
+    def __iter__(self):
+        for start in range(0, len(self.features), self.chunk_rows):
+            yield np.asarray(self.features[start:start + self.chunk_rows]), \
+                np.asarray(self.labels[start:start + self.chunk_rows])
+
+
+class npy_source:
+    __slots__ = ("path", "label_column", "chunk_rows", "feature_names")
+
+    def __init__(self, path, label_column=-1, chunk_rows=CHUNK_ROWS,
+                 feature_names=None):
+        self.path = path
+        self.label_column = label_column
+        self.chunk_rows = chunk_rows
+        self.feature_names = feature_names
+
+    def __iter__(self):
+        with open(self.path, "rb") as file:
+            version = np.lib.format.read_magic(file)
+            read_header = np.lib.format.read_array_header_1_0 \
+                if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(file)
+
+            if fortran_order or len(shape) != 2:
+                raise ValueError("%r does not hold a C-ordered 2-d array"
+                                 % (self.path,))
+
+            rows, columns = shape
+            label_column = self.label_column % columns
+            feature_columns = [column for column in range(columns)
+                               if column != label_column]
+
+            for start in range(0, rows, self.chunk_rows):
+                count = min(self.chunk_rows, rows - start)
+                chunk = np.fromfile(file, dtype, count * columns).reshape(
+                    count, columns)
+
+                yield chunk[:, feature_columns], chunk[:, label_column]
+
+
+class csv_source:
+    __slots__ = ("path", "label_column", "chunk_rows", "delimiter",
+                 "header", "label_type", "feature_names")
+
+    def __init__(self, path, label_column=-1, chunk_rows=CHUNK_ROWS,
+                 delimiter=",", header=True, label_type=str):
+        self.path = path
+        self.label_column = label_column
+        self.chunk_rows = chunk_rows
+        self.delimiter = delimiter
+        self.header = header
+        self.label_type = label_type
+        self.feature_names = None
+
+        if header:
+            with open(path, newline="") as file:
+                names = next(csv.reader(file, delimiter=delimiter), [])
+
+            label_column = label_column % len(names) if names else 0
+            self.feature_names = tuple(
+                name for column, name in enumerate(names)
+                if column != label_column)
+
+    def __iter__(self):
+        with open(self.path, newline="") as file:
+            reader = csv.reader(file, delimiter=self.delimiter)
+
+            if self.header:
+                next(reader, None)
+
+            while True:
+                rows = list(islice(reader, self.chunk_rows))
+
+                if not rows:
+                    return
+
+                label_column = self.label_column % len(rows[0])
+                labels = np.array([self.label_type(row[label_column])
+                                   for row in rows])
+
+                for row in rows:
+                    del row[label_column]
+
+                yield np.array(rows, dtype=np.float64), labels
+
+
+def _route(binned, split_features, split_bins, left_nodes, right_nodes,
+           depth):
+    node_ids = np.zeros(len(binned), dtype=np.intp)
+    rows = np.arange(len(binned))
+
+    for _ in range(depth):
+        features = split_features[node_ids]
+        internal = features >= 0
+
+        if not internal.any():
+            break
+
+        goes_right = binned[rows, np.maximum(features, 0)] \
+            > split_bins[node_ids]
+        node_ids = np.where(
+            internal,
+            np.where(goes_right, right_nodes[node_ids], left_nodes[node_ids]),
+            node_ids)
+
+    return node_ids
+
+
+class _stream_tree:
+    __slots__ = ("features", "bins", "left", "right", "leaves")
+
+    def __init__(self):
+        self.features = [-1]
+        self.bins = [0]
+        self.left = [-1]
+        self.right = [-1]
+        self.leaves = {}
+
+    def add(self):
+        self.features.append(-1)
+        self.bins.append(0)
+        self.left.append(-1)
+        self.right.append(-1)
+
+        return len(self.features) - 1
+
+    def routing(self):
+        return (np.array(self.features, dtype=np.intp),
+                np.array(self.bins, dtype=np.intp),
+                np.array(self.left, dtype=np.intp),
+                np.array(self.right, dtype=np.intp))
+
+    def build(self, edges, feature_names):
+        nodes = [_make_node(None) for _ in self.features]
+
+        for node_id, node in enumerate(nodes):
+            if node_id in self.leaves:
+                node.decision = constant_leaf(self.leaves[node_id])
+
+                continue
+
+            feature = self.features[node_id]
+            node.decision = threshold_split(
+                feature_names[feature],
+                (edges[feature, self.bins[node_id]].item(),))
+            node.child_nodes[0] = nodes[self.left[node_id]]
+            node.child_nodes[1] = nodes[self.right[node_id]]
+
+        return nodes[0]
+
+
+class tree_learner:
+    __slots__ = ("criterion", "max_depth", "min_samples_split",
+                 "min_samples_leaf", "max_bins", "min_impurity_decrease",
+                 "workers", "parallel_rows")
+
+    def __init__(self, criterion="gini", max_depth=None, min_samples_split=2,
+                 min_samples_leaf=1, max_bins=255, min_impurity_decrease=0.0,
+                 workers=1, parallel_rows=None):
+        if criterion not in CRITERIA:
+            raise ValueError("unknown split criterion %r" % (criterion,))
+
+        if not 2 <= max_bins <= 65536:
+            raise ValueError("max_bins must be between 2 and 65536")
+
+        self.criterion = criterion
+        self.max_depth = max_depth
+        self.min_samples_split = max(min_samples_split, 2)
+        self.min_samples_leaf = max(min_samples_leaf, 1)
+        self.max_bins = max_bins
+        self.min_impurity_decrease = min_impurity_decrease
+        self.workers = workers
+        self.parallel_rows = parallel_rows
+
+    def _targets(self, labels):
+        if self.criterion == "variance":
+            return labels.astype(np.float64), None
+
+        classes, targets = np.unique(labels, return_inverse=True)
+
+        return targets.ravel().astype(np.intp), classes
+
+    def _training_data(self, features, labels, feature_names):
+        if np is None:
+            raise ImportError("tree_learner requires numpy")
+
+        features = np.asarray(features)
+        labels = np.asarray(labels)
+
+        if features.ndim != 2 or labels.ndim != 1 \
+           or len(features) != len(labels):
+            raise ValueError(
+                "expected features of shape (rows, features) and labels of "
+                "shape (rows,), got %r and %r"
+                % (features.shape, labels.shape))
+
+        feature_names = _feature_names(feature_names, features.shape[1])
+
+        if not len(labels):
+            return None
+
+        targets, classes = self._targets(labels)
+
+        return _training_data(
+            features,
+            np.empty(features.shape,
+                     dtype=np.uint8 if self.max_bins <= 256 else np.uint16),
+            targets, np.arange(len(labels)),
+            np.empty((features.shape[1], self.max_bins - 1)), classes,
+            feature_names)
+
+    def fit(self, features, labels, feature_names=None,
+            tree_class=iterative_decision_tree):
+        data = self._training_data(features, labels, feature_names)
+
+        if data is None:
+            return tree_class()
+
+        workers = self.workers or os.cpu_count() or 1
+
+        if workers == 1:
+            _bin_columns(data, self.max_bins, 0, data.features.shape[1])
+
+            return tree_class(_grow(self, data, 0, len(data.targets), 0))
+
+        return tree_class(self._fit_parallel(data, workers))
+
+    def _scan(self, source):
+        rng = np.random.default_rng(0)
+        sample = sample_keys = None
+        classes = None
+        row_count = 0
+
+        for features, labels in source:
+            row_count += len(features)
+            keys = rng.random(len(features))
+
+            if sample is None:
+                sample, sample_keys = np.array(features), keys
+            else:
+                sample = np.concatenate([sample, features])
+                sample_keys = np.concatenate([sample_keys, keys])
+
+            if len(sample) > EDGE_SAMPLE_ROWS:
+                kept = np.sort(np.argpartition(
+                    sample_keys, EDGE_SAMPLE_ROWS)[:EDGE_SAMPLE_ROWS])
+                sample, sample_keys = sample[kept], sample_keys[kept]
+
+            if self.criterion != "variance":
+                classes = np.unique(labels) if classes is None \
+                    else np.union1d(classes, labels)
+
+        return sample, classes, row_count
+
+    def _stream_histograms(self, source, edges, classes, tree, node_ids,
+                           depth):
+        feature_count, bin_count = edges.shape[0], edges.shape[1] + 1
+        stat_count = 3 if self.criterion == "variance" else len(classes)
+        positions = np.full(len(tree.features), -1, dtype=np.intp)
+        positions[node_ids] = np.arange(len(node_ids))
+        cells_count = len(node_ids) * feature_count * bin_count
+
+        if self.criterion == "variance":
+            histogram = np.zeros((3, cells_count))
+        else:
+            histogram = np.zeros(cells_count * stat_count)
+
+        routing = tree.routing()
+        offsets = np.arange(feature_count) * bin_count
+
+        for features, labels in source:
+            binned = np.empty(features.shape, dtype=np.intp)
+
+            for feature in range(feature_count):
+                binned[:, feature] = _bin_column(features[:, feature],
+                                                 edges[feature])
+
+            rows = positions[_route(binned, *routing, depth)]
+            kept = rows >= 0
+            binned, rows, labels = binned[kept], rows[kept], labels[kept]
+            cells = binned + offsets + (rows * feature_count * bin_count)[
+                :, None]
+
+            if self.criterion == "variance":
+                values = np.repeat(labels.astype(np.float64), feature_count)
+                cells = cells.ravel()
+                histogram[0] += np.bincount(cells, minlength=cells_count)
+                histogram[1] += np.bincount(cells, values, cells_count)
+                histogram[2] += np.bincount(cells, values * values,
+                                            cells_count)
+            else:
+                cells = cells * stat_count + np.searchsorted(
+                    classes, labels)[:, None]
+                histogram += np.bincount(cells.ravel(),
+                                         minlength=histogram.size)
+
+        if self.criterion == "variance":
+            return histogram.T.reshape(len(node_ids), feature_count,
+                                       bin_count, 3)
+
+        return histogram.reshape(len(node_ids), feature_count, bin_count,
+                                 stat_count)
+
+    def fit_stream(self, source, feature_names=None,
+                   tree_class=iterative_decision_tree,
+                   max_histogram_bytes=MAX_HISTOGRAM_BYTES):
+        if np is None:
+            raise ImportError("tree_learner requires numpy")
+
+        sample, classes, row_count = self._scan(source)
+
+        if not row_count:
+            return tree_class()
+
+        feature_count = sample.shape[1]
+        feature_names = _feature_names(
+            feature_names or getattr(source, "feature_names", None),
+            feature_count)
+        edges = np.full((feature_count, self.max_bins - 1), np.inf)
+
+        for feature in range(feature_count):
+            values = _column_edges(sample[:, feature], self.max_bins)
+            edges[feature, :len(values)] = values
+
+        sample = None
+        stat_count = 3 if self.criterion == "variance" else len(classes)
+        batch_size = max(1, max_histogram_bytes // (
+            feature_count * self.max_bins * stat_count * 8))
+        tree = _stream_tree()
+        frontier = [0]
+        depth = 0
+
+        while frontier:
+            next_frontier = []
+
+            for start in range(0, len(frontier), batch_size):
+                node_ids = frontier[start:start + batch_size]
+                histograms = self._stream_histograms(
+                    source, edges, classes, tree, node_ids, depth)
+
+                for node_id, histogram in zip(node_ids, histograms):
+                    stats = histogram[0].sum(axis=0)
+                    split = None
+
+                    if _splittable(stats, self.criterion, depth, self):
+                        split = _best_split(histogram, self.criterion,
+                                            self.min_samples_leaf)
+
+                    if split is None or split[2] <= max(
+                            1e-12, self.min_impurity_decrease * row_count):
+                        tree.leaves[node_id] = _leaf_value(
+                            stats, self.criterion, classes)
+
+                        continue
+
+                    feature, bin_index, _, left_stats, right_stats = split
+                    tree.features[node_id] = feature
+                    tree.bins[node_id] = bin_index
+
+                    for side, child_stats in ((tree.left, left_stats),
+                                              (tree.right, right_stats)):
+                        child_id = side[node_id] = tree.add()
+
+                        if _splittable(child_stats, self.criterion,
+                                       depth + 1, self):
+                            next_frontier.append(child_id)
+                        else:
+                            tree.leaves[child_id] = _leaf_value(
+                                child_stats, self.criterion, classes)
+
+            frontier = next_frontier
+            depth += 1
+
+        return tree_class(tree.build(edges, feature_names))
+
+    def _fit_parallel(self, data, workers):
+        buffers = []
+        layouts = []
+
+        try:
+            for name in _training_data.__slots__[:5]:
+                shared, layout = _shared_array(getattr(data, name), buffers)
+                setattr(data, name, shared)
+                layouts.append(layout)
+
+            with ProcessPoolExecutor(
+                    workers, initializer=_training_initializer,
+                    initargs=(self, layouts, data.classes,
+                              data.feature_names)) as pool:
+                for future in [
+                        pool.submit(_bin_task, *group)
+                        for group in _feature_groups(
+                            data.features.shape[1], workers * 4)]:
+                    future.result()
+
+                parallel_rows = self.parallel_rows
+
+                if parallel_rows is None:
+                    parallel_rows = max(len(data.targets) // (workers * 4),
+                                        MIN_PARALLEL_ROWS)
+
+                return _grow_parallel(self, data, pool, workers,
+                                      parallel_rows)
+        finally:
+            for name in _training_data.__slots__[:5]:
+                setattr(data, name, None)
+
+            for memory in buffers:
+                memory.close()
+                memory.unlink()
+
+
+class forest_learner(tree_learner):
+    __slots__ = ("tree_count", "max_features", "bootstrap", "seed")
+
+    def __init__(self, tree_count=100, criterion="gini", max_depth=None,
+                 min_samples_split=2, min_samples_leaf=1, max_bins=255,
+                 min_impurity_decrease=0.0, max_features="sqrt",
+                 bootstrap=True, seed=0, workers=1):
+        tree_learner.__init__(self, criterion, max_depth, min_samples_split,
+                              min_samples_leaf, max_bins,
+                              min_impurity_decrease, workers)
+
+        if not (max_features in (None, "sqrt", "log2")
+                or isinstance(max_features, (int, float))
+                and max_features > 0):
+            raise ValueError("unknown max_features %r" % (max_features,))
+
+        self.tree_count = tree_count
+        self.max_features = max_features
+        self.bootstrap = bootstrap
+        self.seed = seed
+
+    def feature_count(self, feature_count):
+        max_features = self.max_features
+
+        if max_features is None:
+            return feature_count
+
+        if max_features == "sqrt":
+            count = np.sqrt(feature_count)
+        elif max_features == "log2":
+            count = np.log2(max(feature_count, 1))
+        elif isinstance(max_features, float):
+            count = max_features * feature_count
+        else:
+            count = max_features
+
+        return min(feature_count, max(1, int(count)))
+
+    def fit(self, features, labels, feature_names=None,
+            tree_class=iterative_decision_tree):
+        forest = decision_forest(
+            aggregate="mean" if self.criterion == "variance" else "vote")
+        data = self._training_data(features, labels, feature_names)
+
+        if data is None:
+            return forest
+
+        workers = min(self.workers or os.cpu_count() or 1, self.tree_count)
+
+        if workers == 1:
+            _bin_columns(data, self.max_bins, 0, data.features.shape[1])
+
+            for index in range(self.tree_count):
+                forest.add(tree_class(_forest_tree(self, data, index)))
+
+            return forest
+
+        buffers = []
+        layouts = [None]
+
+        try:
+            for name in _training_data.__slots__[1:5]:
+                shared, layout = _shared_array(getattr(data, name), buffers)
+                setattr(data, name, shared)
+                layouts.append(layout)
+
+            _bin_columns(data, self.max_bins, 0, data.features.shape[1])
+
+            with ProcessPoolExecutor(
+                    workers, initializer=_training_initializer,
+                    initargs=(self, layouts, data.classes,
+                              data.feature_names)) as pool:
+                for root in pool.map(_forest_task, range(self.tree_count)):
+                    forest.add(tree_class(root))
+
+            return forest
+        finally:
+            for name in _training_data.__slots__[1:5]:
+                setattr(data, name, None)
+
+            for memory in buffers:
+                memory.close()
+                memory.unlink()
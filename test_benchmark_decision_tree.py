@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from benchmark_decision_tree import SHAPES, IMPLEMENTATIONS, OPERATIONS, \
+    TRAINING_METHODS, build_tree, compare, main, run_benchmarks, \
+    run_training_benchmarks
+
+
+class benchmark_decision_tree_Test(unittest.TestCase):
+    def test_case_1(self):
+        import random
+
+        for shape in SHAPES:
+            root, leaf_paths = build_tree(shape, 50, random.Random(0))
+
+            self.assertTrue(leaf_paths)
+
+            for path in leaf_paths:
+                node = root
+
+                for child_key in path:
+                    node = node.child_nodes[child_key]
+
+                self.assertFalse(node.child_nodes)
+                self.assertEqual(node.decision, "leaf")
+
+        root, leaf_paths = build_tree("chain", 20000, random.Random(0))
+
+        self.assertEqual(leaf_paths, [(0,) * 19999])
+
+    def test_case_2(self):
+        report = run_benchmarks(sizes=(10, 100), samples=50, max_seconds=0.5)
+
+        self.assertEqual(
+            len(report["results"]),
+            len(SHAPES) * 2 * (len(IMPLEMENTATIONS) * len(OPERATIONS) - 2))
+
+        for result in report["results"]:
+            self.assertNotIn("error", result)
+            self.assertEqual(result["tree_size"], result["size"])
+            self.assertGreater(result["calls"], 0)
+            self.assertLessEqual(result["p50_ns"], result["p99_ns"])
+            self.assertGreater(result["tree_memory_bytes"], 0)
+            self.assertGreaterEqual(result["peak_memory_bytes"],
+                                    result["tree_memory_bytes"])
+
+        rows = compare(report, report)
+
+        self.assertEqual(len(rows), len(report["results"]))
+        self.assertTrue(all(row[4] == 0.0 for row in rows))
+
+    def test_case_3(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.json")
+
+            self.assertEqual(main(["--shapes", "balanced", "--sizes", "20",
+                                   "--samples", "20", "--no-memory",
+                                   "--output", path]), 0)
+
+            with open(path) as file:
+                report = json.load(file)
+
+            self.assertEqual(report["meta"]["samples"], 20)
+            self.assertIsNone(report["results"][0]["tree_memory_bytes"])
+            self.assertEqual(main(["--compare", path, path]), 0)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_case_4(self):
+        report = run_training_benchmarks(sizes=(2000,), feature_count=3,
+                                         max_depth=3, chunk_rows=500)
+
+        self.assertEqual([result["method"] for result in report["results"]],
+                         list(TRAINING_METHODS))
+        self.assertEqual(len({result["tree_size"]
+                              for result in report["results"]}), 1)
+
+        for result in report["results"]:
+            self.assertGreater(result["max_rss_kb"], 0)
+            self.assertGreater(result["file_bytes"], 2000 * 4 * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,93 @@
 #!/usr/bin/env python3
 
+import gc
+import pickle
 from queue import Queue
 import unittest
-from decision_tree import tree_node, recursive_decision_tree, \
-    iterative_decision_tree
+from unittest import mock
+import weakref
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from decision_tree import tree_node, compiled_decision_tree, \
+    recursive_decision_tree, iterative_decision_tree, \
+    concurrent_decision_tree, async_decision_tree, tree_build_error, reads, \
+    register_decision, file_subtree_loader, sqlite_subtree_loader, \
+    range_node, equality_map, threshold_split, set_membership, \
+    constant_leaf, decision_forest
+
+
+class citizen_status:
+    __slots__ = ("refund", "marital_status", "taxable_income")
+
+    def __init__(self, refund=None, marital_status=None, taxable_income=None):
+        self.refund = refund
+        self.marital_status = marital_status
+        self.taxable_income = taxable_income
+
+
+@reads("refund")
+def refund_decision(citizen):
+    return "Yes" if citizen.refund is True else "No"
+
+
+def refund_yes_leaf():
+    return "Have nothing to pay"
+
+
+@reads("marital_status")
+def marital_status_decision(citizen):
+    if citizen.marital_status in ("Single,Divorced", "Married", "Widower"):
+        return citizen.marital_status
+
+    return None
+
+
+def marital_status_married_leaf():
+    return "Have to pay, they are 2"
+
+
+@reads("taxable_income")
+def taxable_income_decision(citizen):
+    return "< 80k" if citizen.taxable_income < 80000 else ">= 80k"
+
+
+def taxable_income_higher_or_equal_80k_leaf():
+    return "Have to pay, high income"
+
+
+def taxable_income_smaller_80k_leaf():
+    return "Have nothing to pay, low income"
+
+
+def build_citizen_tree(main_tree):
+    single = citizen_status(False, "Single,Divorced", 0)
+
+    main_tree.add(0, single, None, refund_decision)
+    main_tree.add(1, single, "Yes", refund_yes_leaf)
+    main_tree.add(1, single, "No", marital_status_decision)
+    main_tree.add(2, single, "Single,Divorced", taxable_income_decision)
+    main_tree.add(2, single, "Married", marital_status_married_leaf)
+    main_tree.add(3, single, "< 80k", taxable_income_smaller_80k_leaf)
+    main_tree.add(3, single, ">= 80k", taxable_income_higher_or_equal_80k_leaf)
+
+    return main_tree
+
+
+def citizen_samples():
+    return [
+        citizen_status(False, "Single,Divorced", 120000),
+        citizen_status(True),
+        citizen_status(False, "Married"),
+        citizen_status(False, "Widower"),
+        citizen_status(False, "Single,Divorced", 40000),
+        citizen_status(False, "Unknown"),
+        citizen_status(True, "Married", 10)
+    ]
+
 
 class recursive_decision_tree_Test(unittest.TestCase):
     def test_case_1(self):
@@ -795,6 +879,1591 @@ class iterative_decision_tree_Test(unittest.TestCase):
             leaf_decision(), "go make a snowball fight !")
 
 
+class traversal_many_Test(unittest.TestCase):
+    def test_case_1(self):
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            empty_tree = tree_class()
+            citizens = citizen_samples()
+
+            self.assertEqual(empty_tree.traversal_many(citizens),
+                             [None] * len(citizens))
+            self.assertEqual(empty_tree.get_many(0, citizens),
+                             [None] * len(citizens))
+
+            main_tree = build_citizen_tree(tree_class())
+
+            self.assertEqual(main_tree.traversal_many([]), [])
+            self.assertEqual(
+                main_tree.traversal_many(iter(citizens)),
+                [main_tree.traversal(citizen) for citizen in citizens])
+
+            for depth_level in range(5):
+                self.assertEqual(
+                    main_tree.get_many(depth_level, citizens),
+                    [main_tree.get(depth_level, citizen)
+                     for citizen in citizens])
+
+    def test_case_2(self):
+        calls = []
+
+        def counted_refund_decision(citizen):
+            calls.append(citizen)
+
+            return refund_decision(citizen)
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            main_tree = build_citizen_tree(tree_class())
+            main_tree.get(0, None).decision = counted_refund_decision
+            citizens = citizen_samples() * 3
+
+            calls.clear()
+            main_tree.traversal_many(citizens)
+
+            self.assertEqual(len(calls), len(citizens))
+
+
+class compiled_decision_tree_Test(unittest.TestCase):
+    def test_case_1(self):
+        citizens = citizen_samples()
+
+        self.assertEqual(compiled_decision_tree().size(), 0)
+        self.assertIsNone(compiled_decision_tree().traversal(citizens[0]))
+        self.assertIsNone(compiled_decision_tree().get(0, citizens[0]))
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            main_tree = build_citizen_tree(tree_class())
+            compiled_tree = main_tree.compile()
+
+            self.assertEqual(compiled_tree.size(), main_tree.size())
+
+            for citizen in citizens:
+                self.assertIs(compiled_tree.traversal(citizen),
+                              main_tree.traversal(citizen))
+
+                for depth_level in range(5):
+                    self.assertIs(compiled_tree.get(depth_level, citizen),
+                                  main_tree.get(depth_level, citizen))
+
+    def test_case_2(self):
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        compiled_tree = main_tree.compile()
+        citizen = citizen_status(False, "Widower")
+
+        build_citizen_tree(iterative_decision_tree())
+
+        self.assertIsNone(compiled_tree.traversal(citizen))
+
+        main_tree.add(2, citizen, "Widower", refund_yes_leaf)
+
+        with self.assertRaises(RuntimeError):
+            compiled_tree.traversal(citizen)
+
+        compiled_tree = main_tree.compile()
+
+        self.assertIs(compiled_tree.traversal(citizen), refund_yes_leaf)
+
+        main_tree.get(0, citizen).decision = marital_status_decision
+
+        self.assertFalse(compiled_tree.is_stale())
+
+        main_tree.invalidate()
+
+        with self.assertRaises(RuntimeError):
+            compiled_tree.get(1, citizen)
+
+    def test_case_3(self):
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        compiled_tree = main_tree.compile()
+        citizen = citizen_status(True, "Married")
+        source = weakref.ref(main_tree)
+
+        del main_tree
+        gc.collect()
+
+        self.assertIsNone(source())
+        self.assertIs(compiled_tree.traversal(citizen), refund_yes_leaf)
+        self.assertEqual(compiled_tree.size(), 7)
+
+        with self.assertRaises(RuntimeError):
+            compiled_tree.get(1, citizen)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class traversal_vectorized_Test(unittest.TestCase):
+    def test_case_1(self):
+        def refund_vectorized_decision(columns):
+            return np.where(columns["refund"], "Yes", "No")
+
+        def marital_status_vectorized_decision(columns):
+            known = np.isin(columns["marital_status"],
+                            ["Single,Divorced", "Married", "Widower"])
+
+            return np.where(known, columns["marital_status"], None)
+
+        def taxable_income_vectorized_decision(columns):
+            return np.where(columns["taxable_income"] < 80000,
+                            "< 80k", ">= 80k")
+
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        citizen = citizen_status(False, "Single,Divorced", 0)
+        main_tree.get(0, citizen).vectorized_decision = \
+            refund_vectorized_decision
+        main_tree.get(1, citizen).vectorized_decision = \
+            marital_status_vectorized_decision
+        main_tree.get(2, citizen).vectorized_decision = \
+            taxable_income_vectorized_decision
+
+        rng = np.random.default_rng(42)
+        length = 1000
+        columns = {
+            "refund" : rng.random(length) < 0.3,
+            "marital_status" : rng.choice(
+                ["Single,Divorced", "Married", "Widower", "Unknown"], length),
+            "taxable_income" : rng.integers(0, 160000, length)
+        }
+        citizens = [
+            citizen_status(bool(columns["refund"][index]),
+                           str(columns["marital_status"][index]),
+                           int(columns["taxable_income"][index]))
+            for index in range(length)
+        ]
+
+        leaf_decisions = main_tree.traversal_vectorized(columns)
+
+        self.assertEqual(leaf_decisions.shape, (length,))
+        self.assertEqual(list(leaf_decisions),
+                         [main_tree.traversal(citizen)
+                          for citizen in citizens])
+        self.assertEqual(
+            len(iterative_decision_tree().traversal_vectorized(columns)),
+            length)
+
+        main_tree.get(0, citizen).vectorized_decision = None
+
+        with self.assertRaises(ValueError):
+            main_tree.traversal_vectorized(columns)
+
+
+class size_Test(unittest.TestCase):
+    def test_case_1(self):
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            main_tree = tree_class()
+
+            self.assertEqual(main_tree.size(), 0)
+            self.assertEqual(main_tree.recount(), 0)
+
+            main_tree.add(0, None, None, lambda obj_status: obj_status)
+
+            with mock.patch.object(tree_class, "recount") as recount:
+                for key in range(5000):
+                    main_tree.add(1, None, key, refund_yes_leaf)
+
+                self.assertEqual(main_tree.size(), 5001)
+                self.assertFalse(recount.called)
+
+            self.assertEqual(main_tree.recount(), 5001)
+
+            other_tree = tree_class()
+
+            with mock.patch.object(tree_class, "recount") as recount:
+                other_tree.add_by_path((), refund_yes_leaf)
+                other_tree.invalidate()
+
+                self.assertEqual(main_tree.size(), 5001)
+                self.assertFalse(recount.called)
+
+            main_tree.get(1, 0).child_nodes = {
+                "Yes" : tree_node(refund_yes_leaf)
+            }
+
+            self.assertEqual(main_tree.size(), 5002)
+
+            with mock.patch.object(tree_class, "recount") as recount:
+                main_tree.add(1, None, "No", refund_yes_leaf)
+
+                self.assertEqual(main_tree.size(), 5003)
+                self.assertFalse(recount.called)
+
+            del main_tree.get(0, None).child_nodes["No"]
+
+            self.assertEqual(main_tree.size(), 5003)
+
+            main_tree.invalidate()
+
+            self.assertEqual(main_tree.size(), 5002)
+
+            subtree = tree_class(main_tree.get(1, 0))
+
+            self.assertEqual(subtree.size(), 2)
+
+            main_tree.add(2, 0, "No", refund_yes_leaf)
+
+            self.assertEqual(subtree.size(), 2)
+            self.assertEqual(main_tree.size(), 5003)
+
+            subtree.invalidate()
+
+            self.assertEqual(subtree.size(), 3)
+
+
+class leaf_cache_Test(unittest.TestCase):
+    def test_case_1(self):
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        citizens = citizen_samples()
+        expected = [main_tree.traversal(citizen) for citizen in citizens]
+
+        self.assertIsNone(main_tree.cache_info())
+
+        main_tree.enable_cache(maxsize=4)
+
+        self.assertEqual(
+            [main_tree.traversal(citizen) for citizen in citizens], expected)
+        self.assertEqual(tuple(main_tree.cache_info()), (0, 7, 3, 4, 4))
+        self.assertEqual(
+            main_tree.traversal(citizens[-1]), expected[-1])
+        self.assertEqual(main_tree.cache_info().hits, 1)
+
+        build_citizen_tree(iterative_decision_tree()).add(
+            2, citizens[3], "Widower", refund_yes_leaf)
+
+        self.assertEqual(
+            main_tree.traversal(citizens[-1]), expected[-1])
+        self.assertEqual(main_tree.cache_info().hits, 2)
+
+        main_tree.add(2, citizens[3], "Widower", refund_yes_leaf)
+
+        self.assertEqual(main_tree.traversal(citizens[3]), refund_yes_leaf)
+        self.assertEqual(main_tree.cache_info().currsize, 1)
+
+        main_tree.disable_cache()
+
+        self.assertIsNone(main_tree.cache_info())
+
+    def test_case_2(self):
+        main_tree = iterative_decision_tree()
+        main_tree.add(0, None, None, lambda obj_status: obj_status)
+        main_tree.add(1, 1, 1, refund_yes_leaf)
+
+        with self.assertRaises(ValueError):
+            main_tree.enable_cache()
+
+        main_tree.enable_cache(key=lambda obj_status: obj_status)
+
+        self.assertIs(main_tree.traversal(1), refund_yes_leaf)
+        self.assertIs(main_tree.traversal(1), refund_yes_leaf)
+        self.assertIsNone(main_tree.traversal(2))
+        self.assertEqual(main_tree.cache_info().hits, 1)
+        self.assertEqual(main_tree.cache_info().misses, 2)
+
+    def test_case_3(self):
+        @reads("refund")
+        def refund_key_decision(citizen):
+            return citizen.refund
+
+        @reads("marital_status")
+        def marital_status_key_decision(citizen):
+            return citizen.marital_status
+
+        main_tree = iterative_decision_tree()
+        main_tree.add_by_path((), refund_key_decision)
+        main_tree.add_by_path(("Yes",), refund_yes_leaf)
+        main_tree.enable_cache()
+
+        main_tree.add_by_path(("No",), marital_status_key_decision)
+        main_tree.add_by_path(("No", "Married"), marital_status_married_leaf)
+        main_tree.add_by_path(("No", "Single,Divorced"),
+                              taxable_income_smaller_80k_leaf)
+
+        self.assertIs(main_tree.traversal(citizen_status("No", "Married")),
+                      marital_status_married_leaf)
+        self.assertIs(
+            main_tree.traversal(citizen_status("No", "Single,Divorced")),
+            taxable_income_smaller_80k_leaf)
+        self.assertIs(main_tree.traversal(citizen_status("No", "Married")),
+                      marital_status_married_leaf)
+        self.assertEqual(main_tree.cache_info().hits, 1)
+
+        main_tree.add_by_path(("No", "Widower"),
+                              lambda citizen: citizen.taxable_income)
+        main_tree.add_by_path(("No", "Widower", 0), refund_yes_leaf)
+
+        with self.assertRaises(ValueError):
+            main_tree.traversal(citizen_status("No", "Widower"))
+
+
+class memoize_Test(unittest.TestCase):
+    def test_case_1(self):
+        calls = []
+
+        def score_decision(obj_status):
+            calls.append(obj_status)
+
+            return "high" if obj_status >= 50 else "low"
+
+        def parity_decision(obj_status):
+            return "even" if obj_status % 2 == 0 else "odd"
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            for memoize in (False, True):
+                root = tree_node(score_decision, memoize=memoize)
+                parity = tree_node(parity_decision)
+                rescore = tree_node(score_decision, memoize=memoize)
+                root.child_nodes = {"high" : parity, "low" : parity}
+                parity.child_nodes = {"even" : rescore,
+                                      "odd" : tree_node(refund_yes_leaf)}
+                rescore.child_nodes = {"high" : tree_node(refund_yes_leaf)}
+                main_tree = tree_class(root)
+                calls_per_walk = 1 if memoize else 2
+
+                calls.clear()
+
+                self.assertIs(main_tree.traversal(60), refund_yes_leaf)
+                self.assertEqual(len(calls), calls_per_walk)
+
+                calls.clear()
+
+                self.assertIsNone(main_tree.traversal(40))
+                self.assertEqual(len(calls), calls_per_walk)
+
+                calls.clear()
+
+                self.assertIs(main_tree.get(2, 60), rescore)
+                self.assertEqual(len(calls), 1)
+
+                calls.clear()
+
+                self.assertEqual(
+                    main_tree.traversal_many([60, 40, 60]),
+                    [refund_yes_leaf, None, refund_yes_leaf])
+                self.assertEqual(len(calls), 3 * calls_per_walk)
+
+                calls.clear()
+                node, inserted = main_tree.add(4, 60, "low", refund_yes_leaf)
+
+                self.assertTrue(inserted)
+                self.assertEqual(len(calls), calls_per_walk)
+
+
+class concurrent_decision_tree_Test(unittest.TestCase):
+    def test_case_1(self):
+        main_tree = build_citizen_tree(concurrent_decision_tree())
+        citizens = citizen_samples()
+        reference_tree = build_citizen_tree(iterative_decision_tree())
+
+        self.assertEqual(main_tree.size(), reference_tree.size())
+        self.assertEqual(
+            [main_tree.traversal(citizen) for citizen in citizens],
+            [reference_tree.traversal(citizen) for citizen in citizens])
+
+        snapshot = main_tree.snapshot()
+        old_root = main_tree.get(0, citizens[3])
+        old_marital_status = main_tree.get(1, citizens[3])
+        node, inserted = main_tree.add(
+            2, citizens[3], "Widower", refund_yes_leaf)
+
+        self.assertTrue(inserted)
+        self.assertIs(main_tree.traversal(citizens[3]), refund_yes_leaf)
+        self.assertIs(main_tree.get(2, citizens[3]), node)
+        self.assertIsNot(main_tree.get(0, citizens[3]), old_root)
+        self.assertNotIn("Widower", old_marital_status.child_nodes)
+        self.assertIsNone(snapshot.traversal(citizens[3]))
+        self.assertIs(main_tree.get(1, citizens[1]),
+                      snapshot.get(1, citizens[1]))
+        self.assertEqual(main_tree.size(), snapshot.size() + 1)
+        self.assertEqual(main_tree.add(2, citizens[3], "Widower", None),
+                         (node, False))
+
+    def test_case_2(self):
+        import threading
+
+        main_tree = concurrent_decision_tree()
+        main_tree.add(0, None, None, lambda obj_status: obj_status)
+        main_tree.add(1, None, 0, refund_yes_leaf)
+        errors = []
+        writing = threading.Event()
+        writing.set()
+
+        def reader():
+            try:
+                while writing.is_set():
+                    for key in range(0, 500, 7):
+                        leaf_decision = main_tree.traversal(key)
+
+                        if leaf_decision not in (None, refund_yes_leaf):
+                            errors.append(leaf_decision)
+            except Exception as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+
+        for thread in readers:
+            thread.start()
+
+        for key in range(500):
+            main_tree.add(1, None, key, refund_yes_leaf)
+
+        writing.clear()
+
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(main_tree.size(), 501)
+        self.assertEqual(main_tree.recount(), 501)
+
+
+class parallel_traversal_Test(unittest.TestCase):
+    def test_case_1(self):
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        citizens = citizen_samples() * 50
+
+        try:
+            self.assertEqual(
+                main_tree.parallel_traversal(citizens, workers=2,
+                                             chunksize=16),
+                main_tree.traversal_many(citizens))
+
+            pool = main_tree._pool
+
+            self.assertEqual(
+                main_tree.parallel_traversal(citizens[:3], workers=2),
+                main_tree.traversal_many(citizens[:3]))
+            self.assertIs(main_tree._pool, pool)
+
+            build_citizen_tree(iterative_decision_tree())
+            main_tree.parallel_traversal(citizens[:3], workers=2)
+
+            self.assertIs(main_tree._pool, pool)
+
+            main_tree.add(2, citizens[3], "Widower", refund_yes_leaf)
+
+            self.assertEqual(
+                main_tree.parallel_traversal(citizens, workers=2),
+                main_tree.traversal_many(citizens))
+            self.assertIsNot(main_tree._pool, pool)
+            self.assertEqual(main_tree.parallel_traversal([], workers=2), [])
+        finally:
+            main_tree.close_pool()
+
+    def test_case_2(self):
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        main_tree.add(2, citizen_status(False, "Widower"), "Widower",
+                      lambda: "Unknown action")
+
+        with self.assertRaises(ValueError) as context:
+            main_tree.parallel_traversal(citizen_samples(), workers=2)
+
+        self.assertIn("('No', 'Widower')", str(context.exception))
+        self.assertIsNone(main_tree._pool)
+
+    def test_case_3(self):
+        node = tree_node(refund_decision)
+        main_tree = iterative_decision_tree(node)
+
+        for _ in range(1000):
+            node.child_nodes["Yes"] = tree_node(refund_decision)
+            node = node.child_nodes["Yes"]
+
+        node.child_nodes["Yes"] = tree_node(refund_yes_leaf)
+        citizens = [citizen_status(True), citizen_status(False)] * 4
+
+        try:
+            self.assertEqual(
+                main_tree.parallel_traversal(citizens, workers=2),
+                main_tree.traversal_many(citizens))
+        finally:
+            main_tree.close_pool()
+
+
+class traversal_stream_Test(unittest.TestCase):
+    def test_case_1(self):
+        from itertools import count, islice
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            main_tree = build_citizen_tree(tree_class())
+            citizens = citizen_samples()
+            pulled = []
+
+            def events():
+                for index in count():
+                    pulled.append(index)
+
+                    yield citizens[index % len(citizens)]
+
+            stream = main_tree.traversal_stream(
+                events(), batch_size=4, max_in_flight=3)
+            results = list(islice(stream, 5))
+
+            self.assertEqual(len(pulled), 6)
+            self.assertEqual(
+                results,
+                [(citizen, main_tree.traversal(citizen))
+                 for citizen in citizens[:5]])
+            self.assertEqual(
+                list(main_tree.traversal_stream(citizens)),
+                list(zip(citizens, main_tree.traversal_many(citizens))))
+            self.assertEqual(list(main_tree.traversal_stream([])), [])
+
+            with self.assertRaises(ValueError):
+                next(main_tree.traversal_stream(citizens, batch_size=0))
+
+
+class async_decision_tree_Test(unittest.TestCase):
+    def test_case_1(self):
+        import asyncio
+
+        in_flight = []
+        peak = []
+
+        async def refund_async_decision(citizen):
+            in_flight.append(citizen)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(citizen)
+
+            return refund_decision(citizen)
+
+        async def scenario():
+            main_tree = async_decision_tree()
+            citizens = citizen_samples()
+
+            self.assertIsNone(await main_tree.async_traversal(citizens[0]))
+            self.assertEqual(
+                await main_tree.async_add(1, citizens[0], "No", None),
+                (None, False))
+
+            root, inserted = await main_tree.async_add(
+                0, citizens[0], None, refund_async_decision)
+
+            self.assertTrue(inserted)
+
+            for depth_level, key, decision in (
+                    (1, "Yes", refund_yes_leaf),
+                    (1, "No", marital_status_decision),
+                    (2, "Single,Divorced", taxable_income_decision),
+                    (2, "Married", marital_status_married_leaf),
+                    (3, "< 80k", taxable_income_smaller_80k_leaf),
+                    (3, ">= 80k", taxable_income_higher_or_equal_80k_leaf)):
+                node, inserted = await main_tree.async_add(
+                    depth_level, citizens[0], key, decision)
+
+                self.assertTrue(inserted)
+
+            reference_tree = build_citizen_tree(iterative_decision_tree())
+            expected = [reference_tree.traversal(citizen)
+                        for citizen in citizens]
+
+            self.assertEqual(main_tree.size(), reference_tree.size())
+            self.assertEqual(
+                [await main_tree.async_traversal(citizen)
+                 for citizen in citizens], expected)
+            self.assertIs(await main_tree.async_get(0, citizens[0]), root)
+            self.assertIsNone(await main_tree.async_get(4, citizens[0]))
+
+            peak.clear()
+
+            self.assertEqual(
+                await main_tree.async_traversal_many(citizens), expected)
+            self.assertEqual(max(peak), len(citizens))
+
+            peak.clear()
+
+            self.assertEqual(
+                await main_tree.async_traversal_many(citizens, limit=2),
+                expected)
+            self.assertEqual(max(peak), 2)
+
+        asyncio.run(scenario())
+
+    def test_case_2(self):
+        async def refund_async_decision(citizen):
+            return refund_decision(citizen)
+
+        main_tree = async_decision_tree()
+        main_tree.add_by_path((), refund_async_decision)
+        main_tree.add_by_path(("Yes",), refund_yes_leaf)
+
+        for name in ("traversal", "traversal_many", "get", "get_many", "add",
+                     "parallel_traversal", "traversal_vectorized"):
+            self.assertFalse(hasattr(main_tree, name))
+
+        for walk in (main_tree.compile, main_tree.traversal_stream):
+            with self.assertRaises(TypeError):
+                walk(citizen_samples())
+
+        self.assertEqual(main_tree.size(), 2)
+        self.assertIs(main_tree.get_by_path(("Yes",)).decision,
+                      refund_yes_leaf)
+
+
+class save_load_Test(unittest.TestCase):
+    def test_case_1(self):
+        import os
+        import tempfile
+
+        for decision in (refund_decision, refund_yes_leaf,
+                         marital_status_decision, marital_status_married_leaf,
+                         taxable_income_decision,
+                         taxable_income_higher_or_equal_80k_leaf,
+                         taxable_income_smaller_80k_leaf):
+            register_decision(decision)
+
+        citizens = citizen_samples()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "citizen.tree")
+
+            for tree_class in (recursive_decision_tree,
+                               iterative_decision_tree):
+                main_tree = build_citizen_tree(tree_class())
+                main_tree.get(0, citizens[0]).memoize = True
+                main_tree.save(path)
+                loaded_tree = tree_class.load(path)
+                root = loaded_tree.get(0, citizens[0])
+                refund_yes = root.child_nodes["Yes"]
+
+                self.assertEqual(loaded_tree.size(), main_tree.size())
+                self.assertTrue(root.memoize)
+                self.assertIsNone(root.vectorized_decision)
+
+                with self.assertRaises(AttributeError):
+                    tree_node.child_nodes.__get__(refund_yes)
+
+                self.assertEqual(
+                    [loaded_tree.traversal(citizen) for citizen in citizens],
+                    [main_tree.traversal(citizen) for citizen in citizens])
+                self.assertEqual(loaded_tree.recount(), main_tree.size())
+
+                copied_tree = tree_class(pickle.loads(pickle.dumps(
+                    tree_class.load(path).get(0, citizens[0]))))
+
+                self.assertEqual(
+                    [copied_tree.traversal(citizen) for citizen in citizens],
+                    [main_tree.traversal(citizen) for citizen in citizens])
+
+                closed_tree = tree_class.load(path)
+                closed_tree.close()
+                closed_tree.close()
+
+                with self.assertRaises(ValueError):
+                    closed_tree.get(1, citizens[0])
+
+            tree_class().save(path)
+
+            self.assertEqual(iterative_decision_tree.load(path).size(), 0)
+
+            keys = [None, False, True, 7, -1, 2 ** 70, 1.5, "Yes", b"No",
+                    ("No", 2)]
+            main_tree = iterative_decision_tree()
+            main_tree.add(0, None, None, refund_decision)
+
+            for key in keys:
+                main_tree.add(1, None, key, refund_yes_leaf)
+
+            main_tree.save(path)
+            root = iterative_decision_tree.load(path).get(0, None)
+
+            self.assertEqual(
+                [(type(key), key) for key in root.child_nodes],
+                [(type(key), key) for key in keys])
+
+            main_tree.add(1, None, "unregistered", lambda: None)
+
+            with self.assertRaises(ValueError) as context:
+                main_tree.save(path)
+
+            self.assertIn("('unregistered',)", str(context.exception))
+
+
+class build_from_paths_Test(unittest.TestCase):
+    def test_case_1(self):
+        paths = {
+            () : refund_decision,
+            ("Yes",) : refund_yes_leaf,
+            ("No",) : marital_status_decision,
+            ("No", "Single,Divorced") : taxable_income_decision,
+            ("No", "Married") : marital_status_married_leaf,
+            ("No", "Single,Divorced", "< 80k") :
+            taxable_income_smaller_80k_leaf,
+            ("No", "Single,Divorced", ">= 80k") :
+            taxable_income_higher_or_equal_80k_leaf
+        }
+        spec = {
+            "decision" : refund_decision,
+            "child_nodes" : {
+                "Yes" : {"decision" : refund_yes_leaf},
+                "No" : {
+                    "decision" : marital_status_decision,
+                    "child_nodes" : {
+                        "Single,Divorced" : {
+                            "decision" : taxable_income_decision,
+                            "child_nodes" : {
+                                "< 80k" : {
+                                    "decision" :
+                                    taxable_income_smaller_80k_leaf
+                                },
+                                ">= 80k" : {
+                                    "decision" :
+                                    taxable_income_higher_or_equal_80k_leaf
+                                }
+                            }
+                        },
+                        "Married" : {"decision" : marital_status_married_leaf}
+                    }
+                }
+            }
+        }
+        citizens = citizen_samples()
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            reference_tree = build_citizen_tree(tree_class())
+            expected = [reference_tree.traversal(citizen)
+                        for citizen in citizens]
+
+            for main_tree in (tree_class.build_from_paths(paths),
+                              tree_class.build_from_paths(
+                                  reversed(list(paths.items()))),
+                              tree_class.from_dict(spec)):
+                self.assertEqual(main_tree.size(), 7)
+                self.assertEqual(main_tree.recount(), 7)
+                self.assertEqual(
+                    [main_tree.traversal(citizen) for citizen in citizens],
+                    expected)
+
+            self.assertEqual(
+                list(tree_class.from_dict(spec).get(1, citizens[0])
+                     .child_nodes),
+                ["Single,Divorced", "Married"])
+            self.assertEqual(tree_class.build_from_paths({}).size(), 0)
+            self.assertIsNone(tree_class.from_dict({}).traversal(None))
+
+    def test_case_2(self):
+        with self.assertRaises(tree_build_error) as context:
+            iterative_decision_tree.build_from_paths([
+                ((), refund_decision),
+                (("Yes",), refund_yes_leaf),
+                (("Yes",), marital_status_married_leaf),
+                (("Yes",), refund_decision),
+                (("No", "Married"), marital_status_married_leaf),
+                (("No", "Single,Divorced", "< 80k"),
+                 taxable_income_smaller_80k_leaf)
+            ])
+
+        self.assertEqual(context.exception.conflicts, [("Yes",)])
+        self.assertEqual(context.exception.orphans,
+                         [("No", "Married"),
+                          ("No", "Single,Divorced", "< 80k")])
+        self.assertIsInstance(context.exception, ValueError)
+
+        with self.assertRaises(tree_build_error) as context:
+            recursive_decision_tree.build_from_paths(
+                {("Yes",) : refund_yes_leaf})
+
+        self.assertEqual(context.exception.orphans, [("Yes",)])
+
+
+class by_path_Test(unittest.TestCase):
+    def test_case_1(self):
+        calls = []
+
+        def counted(decision):
+            def counted_decision(obj_status):
+                calls.append(obj_status)
+
+                return decision(obj_status)
+
+            return counted_decision
+
+        paths = [
+            ((), counted(refund_decision)),
+            (("Yes",), refund_yes_leaf),
+            (("No",), counted(marital_status_decision)),
+            (("No", "Single,Divorced"), counted(taxable_income_decision)),
+            (("No", "Married"), marital_status_married_leaf),
+            (("No", "Single,Divorced", "< 80k"),
+             taxable_income_smaller_80k_leaf),
+            (("No", "Single,Divorced", ">= 80k"),
+             taxable_income_higher_or_equal_80k_leaf)
+        ]
+        citizens = citizen_samples()
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree,
+                           concurrent_decision_tree):
+            main_tree = tree_class()
+
+            self.assertIsNone(main_tree.get_by_path(()))
+            self.assertEqual(main_tree.add_by_path(["No"], None),
+                             (None, False))
+
+            for keys, decision in paths:
+                node, inserted = main_tree.add_by_path(keys, decision)
+
+                self.assertTrue(inserted)
+                self.assertIs(node.decision, decision)
+                self.assertIs(main_tree.get_by_path(keys), node)
+
+            self.assertEqual(calls, [])
+            self.assertEqual(main_tree.size(), len(paths))
+            self.assertEqual(
+                main_tree.add_by_path(("No", "Married"), None),
+                (main_tree.get_by_path(("No", "Married")), False))
+            self.assertEqual(
+                main_tree.add_by_path((), None),
+                (main_tree.get_by_path(()), False))
+            self.assertEqual(
+                main_tree.add_by_path(("No", "Widower", "Any"), None),
+                (None, False))
+            self.assertIsNone(main_tree.get_by_path(("No", "Widower")))
+            self.assertEqual(calls, [])
+
+            reference_tree = build_citizen_tree(iterative_decision_tree())
+
+            self.assertEqual(
+                [main_tree.traversal(citizen) for citizen in citizens],
+                [reference_tree.traversal(citizen) for citizen in citizens])
+
+            for citizen in citizens[2:6]:
+                self.assertIs(main_tree.get(2, citizen),
+                              main_tree.get_by_path(
+                                  ("No", citizen.marital_status)))
+
+            calls.clear()
+
+
+class instrumentation_Test(unittest.TestCase):
+    def test_case_1(self):
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        citizens = citizen_samples()
+        expected = [main_tree.traversal(citizen) for citizen in citizens]
+
+        self.assertIsNone(main_tree.instrumentation_snapshot())
+
+        main_tree.enable_instrumentation()
+
+        self.assertEqual(
+            [main_tree.traversal(citizen) for citizen in citizens], expected)
+
+        def counters(*keys):
+            return main_tree.instrumentation_snapshot()[
+                main_tree.get_by_path(keys)]
+
+        self.assertEqual(counters()["visits"], 7)
+        self.assertEqual(counters()["fall_offs"], 0)
+        self.assertGreater(counters()["decision_time"], 0.0)
+        self.assertEqual(counters("Yes")["visits"], 2)
+        self.assertEqual(counters("Yes")["leaf_hits"], 2)
+        self.assertEqual(counters("No")["visits"], 5)
+        self.assertEqual(counters("No")["fall_offs"], 2)
+        self.assertEqual(
+            counters("No", "Single,Divorced", "< 80k")["leaf_hits"], 1)
+        self.assertEqual(
+            counters("No", "Single,Divorced", ">= 80k")["leaf_hits"], 1)
+
+        self.assertIs(main_tree.get(2, citizens[2]),
+                      main_tree.get_by_path(("No", "Married")))
+        self.assertIsNone(main_tree.get(3, citizens[2]))
+        self.assertEqual(
+            main_tree.add(2, citizens[3], "Widower", refund_yes_leaf)[1],
+            True)
+        self.assertEqual(main_tree.add(9, citizens[3], "Any", None),
+                         (None, False))
+        self.assertEqual(counters("No", "Married")["visits"], 3)
+        self.assertEqual(counters("No", "Married")["leaf_hits"], 1)
+        self.assertEqual(counters("No")["visits"], 9)
+        self.assertEqual(counters("No", "Widower")["visits"], 1)
+        self.assertEqual(counters("No", "Widower")["leaf_hits"], 0)
+
+        main_tree.reset_instrumentation()
+
+        self.assertEqual(
+            counters(),
+            {"visits" : 0, "fall_offs" : 0, "leaf_hits" : 0,
+             "decision_time" : 0.0})
+
+        main_tree.disable_instrumentation()
+
+        self.assertIsNone(main_tree.instrumentation_snapshot())
+        self.assertEqual(
+            [main_tree.traversal(citizen) for citizen in citizens[:3]],
+            expected[:3])
+
+
+class optimize_Test(unittest.TestCase):
+    def test_case_1(self):
+        citizens = citizen_samples()
+        traffic = [citizen_status(False, "Married")] * 20 + \
+            [citizen_status(False, "Single,Divorced", 40000)] * 10 + citizens
+        key_hints = {
+            refund_decision : {"Yes", "No"},
+            marital_status_decision : {"Single,Divorced", "Married",
+                                       "Widower", None},
+            taxable_income_decision : {"< 80k", ">= 80k"}
+        }
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            main_tree = build_citizen_tree(iterative_decision_tree())
+            main_tree.enable_instrumentation()
+
+            for citizen in traffic:
+                main_tree.traversal(citizen)
+
+            profile = main_tree.instrumentation_snapshot()
+            main_tree = tree_class(main_tree.get_by_path(()))
+            expected = [main_tree.traversal(citizen) for citizen in traffic]
+
+            for hints in (None, key_hints,
+                          {refund_decision : {"Yes", "No"}}):
+                compiled_tree = main_tree.optimize(profile, hints)
+
+                self.assertEqual(
+                    list(main_tree.get_by_path(()).child_nodes),
+                    ["No", "Yes"])
+                self.assertEqual(
+                    list(main_tree.get_by_path(("No",)).child_nodes),
+                    ["Married", "Single,Divorced"])
+                self.assertEqual(
+                    list(main_tree.get_by_path(
+                        ("No", "Single,Divorced")).child_nodes),
+                    ["< 80k", ">= 80k"])
+                self.assertEqual(
+                    [main_tree.traversal(citizen) for citizen in traffic],
+                    expected)
+                self.assertEqual(
+                    [compiled_tree.traversal(citizen) for citizen in traffic],
+                    expected)
+                self.assertEqual(compiled_tree.size(), main_tree.size())
+
+            main_tree.add_by_path(("No", "Widower"), refund_yes_leaf)
+
+            with self.assertRaises(RuntimeError):
+                compiled_tree.traversal(citizens[3])
+
+        self.assertIsNone(
+            iterative_decision_tree().optimize({}, key_hints).traversal(None))
+
+
+class stack_safety_Test(unittest.TestCase):
+    def test_case_1(self):
+        import sys
+
+        depth = sys.getrecursionlimit() * 5
+
+        def zero_decision(obj_status):
+            return 0
+
+        root = node = tree_node(zero_decision)
+
+        for _ in range(depth - 1):
+            node.child_nodes[0] = tree_node(zero_decision)
+            node = node.child_nodes[0]
+
+        node.decision = refund_yes_leaf
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree):
+            main_tree = tree_class(root)
+
+            self.assertEqual(main_tree.size(), depth)
+            self.assertEqual(main_tree.recount(), depth)
+            self.assertIs(main_tree.traversal(None), refund_yes_leaf)
+            self.assertEqual(main_tree.traversal_many([None, None]),
+                             [refund_yes_leaf] * 2)
+            self.assertIs(main_tree.get(depth - 1, None), node)
+            self.assertIsNone(main_tree.get(depth, None))
+            self.assertEqual(main_tree.get_many(depth - 1, [None]), [node])
+            self.assertIs(main_tree.get_by_path((0,) * (depth - 1)), node)
+
+        main_tree = recursive_decision_tree(root)
+        inserted_node, inserted = main_tree.add(depth, None, 1, None)
+
+        self.assertTrue(inserted)
+        self.assertIs(node.child_nodes[1], inserted_node)
+        self.assertEqual(main_tree.size(), depth + 1)
+
+    def test_case_2(self):
+        import sys
+
+        width = sys.getrecursionlimit() * 5
+        main_tree = recursive_decision_tree()
+        main_tree.add(0, None, None, lambda obj_status: obj_status)
+
+        for key in range(width):
+            main_tree.add(1, None, key, refund_yes_leaf)
+
+        self.assertEqual(main_tree.recount(), width + 1)
+        self.assertEqual(main_tree.traversal_many(range(width)),
+                         [refund_yes_leaf] * width)
+
+
+class lazy_subtree_Test(unittest.TestCase):
+    def test_case_1(self):
+        import os
+        import tempfile
+
+        for decision in (refund_decision, refund_yes_leaf,
+                         marital_status_decision, marital_status_married_leaf,
+                         taxable_income_decision,
+                         taxable_income_higher_or_equal_80k_leaf,
+                         taxable_income_smaller_80k_leaf):
+            register_decision(decision)
+
+        citizens = citizen_samples()
+
+        with tempfile.TemporaryDirectory() as directory:
+            for tree_class in (recursive_decision_tree,
+                               iterative_decision_tree):
+                main_tree = build_citizen_tree(tree_class())
+                file_path = os.path.join(directory, "citizen.tree")
+                sqlite_path = os.path.join(directory, "citizen.sqlite")
+                main_tree.save(file_path)
+                main_tree.save(sqlite_path, format="sqlite")
+                expected = [main_tree.traversal(citizen)
+                            for citizen in citizens]
+
+                for loader in (file_subtree_loader(file_path),
+                               sqlite_subtree_loader(sqlite_path)):
+                    lazy_tree = tree_class.load_lazy(loader, maxsize=1)
+
+                    self.assertEqual(lazy_tree.size(), main_tree.size())
+                    self.assertEqual(lazy_tree.subtree_cache_info(),
+                                     (0, 0, 0, 1, 0))
+                    self.assertEqual(
+                        [lazy_tree.traversal(citizen)
+                         for citizen in citizens], expected)
+
+                    loads, evictions, pinned, maxsize, currsize = \
+                        lazy_tree.subtree_cache_info()
+
+                    self.assertEqual((pinned, maxsize, currsize), (0, 1, 1))
+                    self.assertEqual(loads, evictions + 1)
+                    self.assertGreater(evictions, 0)
+                    self.assertEqual(lazy_tree.recount(), main_tree.size())
+
+                    loader.close()
+
+                self.assertIsNone(main_tree.subtree_cache_info())
+
+                with self.assertRaises(ValueError):
+                    main_tree.save(file_path, format="csv")
+
+    def test_case_2(self):
+        import os
+        import tempfile
+
+        for decision in (refund_decision, refund_yes_leaf,
+                         marital_status_decision, marital_status_married_leaf,
+                         taxable_income_decision,
+                         taxable_income_higher_or_equal_80k_leaf,
+                         taxable_income_smaller_80k_leaf):
+            register_decision(decision)
+
+        citizens = citizen_samples()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "citizen.sqlite")
+            build_citizen_tree(iterative_decision_tree()).save(
+                path, format="sqlite")
+            lazy_tree = iterative_decision_tree.load_lazy(
+                sqlite_subtree_loader(path), maxsize=1)
+
+            self.assertEqual(lazy_tree.add_by_path(
+                ("No", "Widower"), refund_decision)[1], True)
+            lazy_tree.get_by_path(("No", "Married")).decision = \
+                refund_yes_leaf
+
+            for citizen in citizens:
+                lazy_tree.traversal(citizen)
+
+            self.assertEqual(lazy_tree.subtree_cache_info().pinned, 2)
+            self.assertIs(lazy_tree.get_by_path(("No", "Married")).decision,
+                          refund_yes_leaf)
+            self.assertIs(
+                lazy_tree.get_by_path(("No", "Widower")).decision,
+                refund_decision)
+            self.assertEqual(lazy_tree.size(), 8)
+
+    def test_case_3(self):
+        import os
+        import tempfile
+
+        for decision in (refund_decision, refund_yes_leaf,
+                         marital_status_decision, marital_status_married_leaf,
+                         taxable_income_decision,
+                         taxable_income_higher_or_equal_80k_leaf,
+                         taxable_income_smaller_80k_leaf):
+            register_decision(decision)
+
+        citizens = citizen_samples()
+
+        with tempfile.TemporaryDirectory() as directory:
+            main_tree = build_citizen_tree(iterative_decision_tree())
+            file_path = os.path.join(directory, "citizen.tree")
+            sqlite_path = os.path.join(directory, "citizen.sqlite")
+            main_tree.save(file_path)
+            main_tree.save(sqlite_path, format="sqlite")
+            expected = main_tree.traversal_many(citizens)
+
+            for loader in (file_subtree_loader(file_path),
+                           sqlite_subtree_loader(sqlite_path)):
+                lazy_tree = iterative_decision_tree.load_lazy(
+                    loader, maxsize=2)
+                compiled_tree = lazy_tree.compile()
+
+                try:
+                    for citizen in citizens:
+                        lazy_tree.traversal(citizen)
+
+                    build_citizen_tree(iterative_decision_tree())
+
+                    self.assertGreater(
+                        lazy_tree.subtree_cache_info().evictions, 0)
+                    self.assertEqual(
+                        [compiled_tree.traversal(citizen)
+                         for citizen in citizens], expected)
+                    self.assertEqual(
+                        lazy_tree.parallel_traversal(citizens, workers=2),
+                        expected)
+                finally:
+                    lazy_tree.close_pool()
+
+                lazy_tree = iterative_decision_tree.load_lazy(
+                    loader, maxsize=1)
+                child_nodes = lazy_tree.get_by_path(("No",)).child_nodes
+                married = lazy_tree.get_by_path(("No", "Married"))
+
+                for citizen in citizens:
+                    lazy_tree.traversal(citizen)
+
+                child_nodes["Widower"] = tree_node(refund_yes_leaf)
+
+                for citizen in citizens:
+                    lazy_tree.traversal(citizen)
+
+                married.decision = refund_yes_leaf
+
+                self.assertIs(
+                    lazy_tree.get_by_path(("No", "Widower")).decision,
+                    refund_yes_leaf)
+                self.assertIs(lazy_tree.get_by_path(("No", "Married")),
+                              married)
+
+
+class range_node_Test(unittest.TestCase):
+    def test_case_1(self):
+        citizens = citizen_samples()
+        expected = [build_citizen_tree(iterative_decision_tree()).traversal(
+            citizen) for citizen in citizens]
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree,
+                           concurrent_decision_tree):
+            main_tree = tree_class()
+            main_tree.add_by_path((), refund_decision)
+            main_tree.add_by_path(("Yes",), refund_yes_leaf)
+            main_tree.add_by_path(("No",), marital_status_decision)
+            main_tree.add_by_path(("No", "Married"),
+                                  marital_status_married_leaf)
+            income_node, added = main_tree.add_by_path(
+                ("No", "Single,Divorced"),
+                range_node("taxable_income", (80000,)))
+
+            self.assertTrue(added)
+            self.assertIsInstance(income_node, range_node)
+            self.assertEqual(main_tree.size(), 5)
+
+            main_tree.add_by_path(("No", "Single,Divorced", 0),
+                                  taxable_income_smaller_80k_leaf)
+            main_tree.add_by_path(("No", "Single,Divorced", 1),
+                                  taxable_income_higher_or_equal_80k_leaf)
+
+            self.assertEqual(main_tree.size(), 7)
+            self.assertEqual(main_tree.recount(), 7)
+            self.assertEqual(
+                [main_tree.traversal(citizen) for citizen in citizens],
+                expected)
+            self.assertEqual(
+                [main_tree.compile().traversal(citizen)
+                 for citizen in citizens], expected)
+            self.assertEqual(
+                [main_tree.optimize({}, {refund_decision : {"Yes", "No"}})
+                 .traversal(citizen) for citizen in citizens], expected)
+
+    def test_case_2(self):
+        income_node = range_node("taxable_income", (50000, 10000, 80000))
+
+        self.assertEqual(income_node.thresholds, (10000, 50000, 80000))
+        self.assertEqual(income_node.decision.reads, ("taxable_income",))
+        self.assertEqual(
+            [income_node.bucket(value)
+             for value in (0, 10000, 49999, 50000, 80000, 10 ** 6)],
+            [0, 1, 1, 2, 3, 3])
+        self.assertEqual(
+            [income_node.bounds(key) for key in range(4)],
+            [(None, 10000), (10000, 50000), (50000, 80000), (80000, None)])
+
+        main_tree = iterative_decision_tree(income_node)
+
+        for key in range(4):
+            main_tree.add_by_path((key,), lambda key=key: key)
+
+        citizens = [citizen_status(taxable_income=value)
+                    for value in range(0, 100000, 2500)]
+
+        self.assertEqual(
+            [main_tree.traversal(citizen)() for citizen in citizens],
+            [income_node.bucket(citizen.taxable_income)
+             for citizen in citizens])
+
+        if np is not None:
+            columns = {"taxable_income" : np.arange(0, 100000, 2500)}
+
+            self.assertEqual(
+                [leaf() for leaf in main_tree.traversal_vectorized(columns)],
+                [income_node.bucket(citizen.taxable_income)
+                 for citizen in citizens])
+
+
+class decision_spec_Test(unittest.TestCase):
+    def test_case_1(self):
+        import os
+        import tempfile
+
+        for decision in (refund_yes_leaf, marital_status_married_leaf,
+                         taxable_income_higher_or_equal_80k_leaf,
+                         taxable_income_smaller_80k_leaf):
+            register_decision(decision)
+
+        citizens = citizen_samples()
+        expected = [build_citizen_tree(iterative_decision_tree()).traversal(
+            citizen) for citizen in citizens]
+        statuses = ("Single,Divorced", "Married", "Widower")
+        main_tree = iterative_decision_tree.from_dict({
+            "decision" : equality_map("refund", {True : "Yes"}, "No"),
+            "child_nodes" : {
+                "Yes" : {"decision" : refund_yes_leaf},
+                "No" : {
+                    "decision" : equality_map(
+                        "marital_status",
+                        {status : status for status in statuses}),
+                    "child_nodes" : {
+                        "Single,Divorced" : {
+                            "decision" : threshold_split(
+                                "taxable_income", (80000,)),
+                            "child_nodes" : {
+                                0 : {"decision" :
+                                     taxable_income_smaller_80k_leaf},
+                                1 : {"decision" :
+                                     taxable_income_higher_or_equal_80k_leaf}
+                            }
+                        },
+                        "Married" : {"decision" : marital_status_married_leaf}
+                    }
+                }
+            }
+        })
+
+        self.assertEqual(
+            [main_tree.traversal(citizen) for citizen in citizens], expected)
+        self.assertEqual(
+            [main_tree.optimize({}).traversal(citizen)
+             for citizen in citizens], expected)
+        self.assertEqual(main_tree.enable_cache().key(citizens[0]),
+                         ("Single,Divorced", False, 120000))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "citizen.tree")
+            main_tree.save(path)
+            loaded_tree = iterative_decision_tree.load(path)
+
+            self.assertEqual(
+                [loaded_tree.traversal(citizen) for citizen in citizens],
+                expected)
+            self.assertEqual(
+                repr(loaded_tree.get_by_path(()).decision),
+                "equality_map('refund', ((True, 'Yes'),), 'No')")
+
+            main_tree.save(path, format="sqlite")
+            loaded_tree = iterative_decision_tree.load_lazy(
+                sqlite_subtree_loader(path))
+
+            self.assertEqual(
+                [loaded_tree.traversal(citizen) for citizen in citizens],
+                expected)
+
+        if np is not None:
+            columns = {
+                "refund" : np.array([citizen.refund for citizen in citizens]),
+                "marital_status" : np.array(
+                    [str(citizen.marital_status) for citizen in citizens]),
+                "taxable_income" : np.array(
+                    [citizen.taxable_income or 0 for citizen in citizens])
+            }
+
+            self.assertEqual(
+                main_tree.traversal_vectorized(columns).tolist(), expected)
+
+    def test_case_2(self):
+        vip = set_membership("marital_status", ("Married", "Widower"))
+        main_tree = recursive_decision_tree(tree_node(vip))
+        main_tree.add_by_path((True,), "shared")
+        main_tree.add_by_path((False,), "single")
+        citizens = citizen_samples()
+
+        self.assertEqual(vip.reads, ("marital_status",))
+        self.assertEqual(
+            [main_tree.traversal(citizen) for citizen in citizens],
+            ["single", "single", "shared", "shared", "single", "single",
+             "shared"])
+        self.assertEqual(
+            [main_tree.optimize({}).traversal(citizen)
+             for citizen in citizens],
+            [main_tree.traversal(citizen) for citizen in citizens])
+
+        if np is not None:
+            self.assertEqual(
+                vip.vectorized({"marital_status" : np.array(
+                    ["Married", "Single,Divorced"])}).tolist(),
+                [True, False])
+
+            status = equality_map("marital_status", {"Married" : "shared",
+                                                     "Widower" : "shared"},
+                                  "single")
+            codes, keys = status.codes({"marital_status" : np.array(
+                ["Widower", "Unknown", "Married"])})
+
+            self.assertEqual(codes.dtype.kind, "i")
+            self.assertEqual([keys[code] for code in codes.tolist()],
+                             ["shared", "single", "shared"])
+
+            for mapping, column in (({1 : "one", 2.5 : "half"},
+                                     np.array([1, 2, 2.5])),
+                                    ({1 : "one", "1" : "text"},
+                                     np.array(["1", "2"])),
+                                    ({1 : "one", "1" : "text"},
+                                     np.array([1, "1", None], dtype=object))):
+                spec = equality_map("marital_status", mapping, "none")
+
+                self.assertEqual(
+                    spec.vectorized({"marital_status" : column}).tolist(),
+                    [mapping.get(value, "none") for value in column.tolist()])
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class decision_forest_Test(unittest.TestCase):
+    def test_case_1(self):
+        from collections import namedtuple
+
+        def leaf(value):
+            return {"decision" : constant_leaf(value)}
+
+        main_trees = [
+            iterative_decision_tree.from_dict({
+                "decision" : threshold_split("income", (50, 100)),
+                "child_nodes" : {0 : leaf("low"), 2 : leaf("high")}
+            }),
+            recursive_decision_tree.from_dict({
+                "decision" : set_membership("status", {"Single"}),
+                "child_nodes" : {True : leaf("low"), False : leaf("high")}
+            }),
+            iterative_decision_tree.from_dict(leaf("high"))
+        ]
+        forest = decision_forest(main_trees)
+        citizen = namedtuple("citizen", ("income", "status"))
+        citizens = [citizen(20, "Single"), citizen(70, "Single"),
+                    citizen(120, "Married")]
+        columns = {
+            "income" : np.array([20, 70, 120]),
+            "status" : np.array(["Single", "Single", "Married"])
+        }
+
+        self.assertEqual(len(forest), 3)
+        self.assertEqual(forest.leaf_values(citizens).tolist(),
+                         [["low", None, "high"], ["low", "low", "high"],
+                          ["high", "high", "high"]])
+        self.assertEqual(forest.predict(citizens).tolist(),
+                         ["low", "low", "high"])
+        self.assertEqual(forest.predict(columns, chunksize=2).tolist(),
+                         ["low", "low", "high"])
+
+        layout = forest._current_layout()
+        iterative_decision_tree.from_dict(leaf("low")).add_by_path(
+            (1,), constant_leaf("high"))
+
+        self.assertIs(forest._current_layout(), layout)
+
+        main_trees[0].add_by_path((1,), constant_leaf("high"))
+
+        self.assertEqual(forest.predict(columns).tolist(),
+                         ["low", "high", "high"])
+
+        metrics = forest.metrics()
+
+        self.assertEqual((metrics.batches, metrics.rows, metrics.tree_rows),
+                         (4, 12, 36))
+        self.assertGreater(metrics.tree_rows_per_second, 0)
+
+        forest.reset_metrics()
+
+        self.assertEqual(forest.metrics().rows, 0)
+        self.assertEqual(decision_forest().predict(columns).tolist(),
+                         [None] * 3)
+
+        with self.assertRaises(ValueError):
+            decision_forest(aggregate="median")
+
+    def test_case_2(self):
+        rng = np.random.default_rng(0)
+        forest = decision_forest(aggregate="mean")
+
+        for tree_index in range(20):
+            thresholds = np.sort(rng.random(3)).tolist()
+            forest.add(iterative_decision_tree.from_dict({
+                "decision" : threshold_split("x", thresholds),
+                "child_nodes" : {
+                    key : {"decision" : constant_leaf(key * tree_index)}
+                    for key in range(4)
+                }
+            }))
+
+        columns = {"x" : rng.random(1000)}
+        expected = np.mean([
+            [leaf() for leaf in main_tree.traversal_vectorized(columns)]
+            for main_tree in forest], axis=0)
+
+        self.assertTrue(np.allclose(forest.predict(columns), expected))
+        self.assertTrue(np.allclose(
+            forest.predict(columns, workers=2, chunksize=300), expected))
+
+        forest.close_pool()
+
+    def test_case_3(self):
+        from collections import namedtuple
+
+        split_tree = iterative_decision_tree.from_dict({
+            "decision" : threshold_split("x", (0.5,)),
+            "child_nodes" : {0 : {"decision" : constant_leaf("L")},
+                             1 : {"decision" : constant_leaf("R")}}
+        })
+        range_tree = iterative_decision_tree.from_dict({
+            "decision" : threshold_split("x", (0.25, 0.75)),
+            "child_nodes" : {
+                key : {"decision" : constant_leaf(key)} for key in range(3)
+            }
+        })
+        citizen = namedtuple("citizen", ("x",))
+        citizens = [citizen(float("nan")), citizen(0.1), citizen(0.6)]
+        columns = {"x" : np.array([np.nan, 0.1, 0.6])}
+
+        for main_trees in ([split_tree], [split_tree, range_tree]):
+            forest = decision_forest(main_trees)
+            expected = [[main_tree.traversal(obj_status)()
+                         for obj_status in citizens]
+                        for main_tree in main_trees]
+
+            self.assertEqual(
+                [[leaf() for leaf in main_tree.traversal_vectorized(columns)]
+                 for main_tree in main_trees], expected)
+            self.assertEqual(forest.leaf_values(citizens).tolist(), expected)
+            self.assertEqual(forest.leaf_values(columns).tolist(), expected)
+
+        self.assertEqual(decision_forest([split_tree]).predict(
+            citizens).tolist(), ["R", "L", "R"])
+
+
+class mutation_Test(unittest.TestCase):
+    def test_case_1(self):
+        citizens = citizen_samples()
+
+        for tree_class in (recursive_decision_tree, iterative_decision_tree,
+                           concurrent_decision_tree):
+            main_tree = build_citizen_tree(tree_class())
+            compiled_tree = main_tree.compile()
+            before = [main_tree.traversal(citizen) for citizen in citizens]
+
+            self.assertEqual(main_tree.size(), 7)
+            self.assertFalse(main_tree.remove(("No", "Widower")))
+            self.assertEqual(main_tree.replace(("Maybe",), None),
+                             (None, False))
+            self.assertTrue(main_tree.remove(("No", "Single,Divorced")))
+            self.assertEqual(main_tree.size(), 4)
+            self.assertIsNone(main_tree.get_by_path(("No", "Single,Divorced")))
+            self.assertIsNone(main_tree.traversal(citizens[0]))
+            self.assertTrue(compiled_tree.is_stale())
+
+            node, replaced = main_tree.replace(("Yes",),
+                                               marital_status_married_leaf)
+
+            self.assertTrue(replaced)
+            self.assertIs(main_tree.get_by_path(("Yes",)), node)
+            self.assertEqual(main_tree.size(), 4)
+            self.assertEqual(main_tree.traversal(citizens[1]),
+                             marital_status_married_leaf)
+            self.assertEqual(main_tree.traversal(citizens[2]), before[2])
+
+            main_tree.replace(("No",), tree_node(None))
+            main_tree.add_by_path(("No", "Married"), refund_yes_leaf)
+
+            self.assertEqual(main_tree.size(), main_tree.recount())
+            self.assertEqual(main_tree.prune(
+                lambda node: node.decision is refund_yes_leaf), 1)
+            self.assertEqual(main_tree.size(), 3)
+            self.assertEqual(main_tree.prune(lambda node: False), 0)
+            self.assertEqual(main_tree.prune(lambda node: True), 1)
+            self.assertEqual(main_tree.size(), 0)
+            self.assertIsNone(main_tree.get_by_path(()))
+            self.assertFalse(main_tree.remove(()))
+
+    def test_case_2(self):
+        main_tree = build_citizen_tree(concurrent_decision_tree())
+        snapshot = main_tree.snapshot()
+        citizens = citizen_samples()
+        expected = [snapshot.traversal(citizen) for citizen in citizens]
+
+        self.assertEqual(main_tree.prune(
+            lambda node: node.decision in (refund_yes_leaf,
+                                           marital_status_married_leaf)), 2)
+        self.assertEqual(main_tree.size(), 5)
+        self.assertEqual([snapshot.traversal(citizen) for citizen in citizens],
+                         expected)
+        self.assertIsNone(main_tree.traversal(citizens[1]))
+        self.assertEqual(main_tree.traversal(citizens[0]), expected[0])
+
+        main_tree = build_citizen_tree(iterative_decision_tree())
+        main_tree.enable_cache()
+        statistics = main_tree.enable_instrumentation()
+
+        for citizen in citizens:
+            main_tree.traversal(citizen)
+
+        self.assertTrue(main_tree.remove(("No",)))
+        self.assertEqual(len(statistics._indexes), 2)
+        self.assertIsNone(main_tree.traversal(citizens[0]))
+
+    def test_case_3(self):
+        import os
+        import tempfile
+
+        for decision in (refund_decision, refund_yes_leaf,
+                         marital_status_decision, marital_status_married_leaf,
+                         taxable_income_decision,
+                         taxable_income_higher_or_equal_80k_leaf,
+                         taxable_income_smaller_80k_leaf):
+            register_decision(decision)
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "citizen.tree")
+            build_citizen_tree(iterative_decision_tree()).save(file_path)
+            lazy_tree = iterative_decision_tree.load_lazy(
+                file_subtree_loader(file_path))
+
+            self.assertTrue(lazy_tree.remove(("No", "Married")))
+            self.assertEqual(lazy_tree.subtree_cache_info().pinned, 2)
+            self.assertEqual(lazy_tree.size(), 6)
+            self.assertTrue(lazy_tree.remove(("No",)))
+            self.assertEqual(lazy_tree.subtree_cache_info()[1:],
+                             (0, 1, 1024, 0))
+            self.assertEqual(lazy_tree.size(), 2)
+            self.assertEqual(lazy_tree.recount(), 2)
+
+
 if __name__ == "__main__":
     import random
 
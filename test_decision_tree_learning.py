@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from decision_tree import iterative_decision_tree, recursive_decision_tree
+from decision_tree_learning import array_source, csv_source, npy_source, \
+    forest_learner, tree_learner
+
+
+def make_dataset(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    features = rng.integers(0, 16, (rows, 4)) / 16
+    labels = np.where(features[:, 0] < 0.5,
+                      np.where(features[:, 2] < 0.25, "low", "mid"), "high")
+
+    return features, labels
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class tree_learner_Test(unittest.TestCase):
+    def test_case_1(self):
+        features, labels = make_dataset(5000)
+        row = namedtuple("row", ("a", "b", "c", "d"))
+
+        for criterion in ("gini", "entropy"):
+            main_tree = tree_learner(criterion, max_depth=4).fit(
+                features, labels, ("a", "b", "c", "d"))
+            predictions = [main_tree.traversal(row(*values))()
+                           for values in features.tolist()]
+
+            self.assertIsInstance(main_tree, iterative_decision_tree)
+            self.assertEqual(predictions, labels.tolist())
+            self.assertEqual(main_tree.size(), 5)
+            self.assertEqual(
+                main_tree.get_by_path(()).decision.attribute, "a")
+
+            columns = {name : features[:, index]
+                       for index, name in enumerate(row._fields)}
+
+            self.assertEqual(
+                [leaf() for leaf in main_tree.traversal_vectorized(columns)],
+                predictions)
+
+        main_tree = tree_learner(max_depth=1).fit(
+            features, labels, tree_class=recursive_decision_tree)
+
+        self.assertIsInstance(main_tree, recursive_decision_tree)
+        self.assertEqual(main_tree.size(), 3)
+        self.assertEqual(tree_learner().fit(np.empty((0, 4)), []).size(), 0)
+
+        with self.assertRaises(ValueError):
+            tree_learner("purity")
+
+        with self.assertRaises(ValueError):
+            tree_learner().fit(features, labels[:10])
+
+    def test_case_2(self):
+        rng = np.random.default_rng(1)
+        features = rng.random((4000, 3))
+        targets = np.where(features[:, 1] < 0.3, 10.0, 0.0) + features[:, 2]
+        main_tree = tree_learner("variance", max_depth=6,
+                                 min_samples_leaf=20).fit(features, targets)
+        columns = {"x%d" % index : features[:, index] for index in range(3)}
+        predictions = np.array(
+            [leaf() for leaf in main_tree.traversal_vectorized(columns)])
+
+        self.assertLess(np.abs(predictions - targets).mean(), 0.05)
+        self.assertEqual(main_tree.get_by_path(()).decision.attribute, "x1")
+        self.assertEqual(
+            tree_learner("variance", max_depth=0).fit(
+                features, targets).get_by_path(()).decision(),
+            targets.mean())
+
+    def test_case_3(self):
+        features, labels = make_dataset(20000, seed=3)
+        features[:, 1] += np.arange(len(features)) % 7
+        columns = {"x%d" % index : features[:, index] for index in range(4)}
+
+        for criterion in ("gini", "variance"):
+            targets = labels if criterion == "gini" \
+                else features[:, 0] * 10 + features[:, 1]
+            serial_tree = tree_learner(criterion, max_depth=6).fit(
+                features, targets)
+            parallel_tree = tree_learner(criterion, max_depth=6, workers=2,
+                                         parallel_rows=3000).fit(
+                features, targets)
+
+            self.assertIsInstance(parallel_tree, iterative_decision_tree)
+            self.assertEqual(parallel_tree.size(), serial_tree.size())
+            self.assertEqual(
+                [leaf() for leaf in parallel_tree.traversal_vectorized(
+                    columns)],
+                [leaf() for leaf in serial_tree.traversal_vectorized(
+                    columns)])
+
+    def test_case_4(self):
+        features, labels = make_dataset(6000, seed=4)
+        columns = {"x%d" % index : features[:, index] for index in range(4)}
+        targets = features[:, 1] * 10 + features[:, 3]
+        codes = np.searchsorted(["high", "low", "mid"], labels)
+
+        for criterion, values in (("gini", labels), ("entropy", labels),
+                                  ("gini", codes), ("variance", targets)):
+            learner = tree_learner(criterion, max_depth=5)
+            main_tree = learner.fit(features, values)
+            stream_tree = learner.fit_stream(
+                array_source(features, values, chunk_rows=700),
+                max_histogram_bytes=1)
+
+            stream_values = [
+                leaf() for leaf in stream_tree.traversal_vectorized(columns)]
+            values = [leaf() for leaf in main_tree.traversal_vectorized(
+                columns)]
+
+            self.assertEqual(stream_tree.size(), main_tree.size())
+            self.assertEqual(set(map(type, stream_values)),
+                             set(map(type, values)))
+            self.assertEqual(stream_values, values)
+
+    def test_case_5(self):
+        features, labels = make_dataset(3000, seed=5)
+        columns = {name : features[:, index]
+                   for index, name in enumerate("abcd")}
+        codes = np.searchsorted(["high", "low", "mid"], labels)
+        main_tree = tree_learner(max_depth=4).fit(features, codes, "abcd")
+
+        with tempfile.TemporaryDirectory() as directory:
+            npy_path = os.path.join(directory, "train.npy")
+            csv_path = os.path.join(directory, "train.csv")
+            codes_path = os.path.join(directory, "codes.csv")
+            np.save(npy_path, np.column_stack((codes, features)))
+
+            for path, column in ((csv_path, labels), (codes_path, codes)):
+                with open(path, "w") as file:
+                    file.write("a,b,c,d,label\n")
+
+                    for values, label in zip(features.tolist(),
+                                             column.tolist()):
+                        file.write("%s,%s\n" % (",".join(map(repr, values)),
+                                                label))
+
+            npy_tree = tree_learner(max_depth=4).fit_stream(
+                npy_source(npy_path, label_column=0, chunk_rows=512), "abcd")
+            csv_tree = tree_learner(max_depth=4).fit_stream(
+                csv_source(csv_path, chunk_rows=512))
+            codes_tree = tree_learner(max_depth=4).fit_stream(
+                csv_source(codes_path, chunk_rows=512, label_type=int))
+
+        self.assertEqual(
+            [leaf() for leaf in npy_tree.traversal_vectorized(columns)],
+            [leaf() for leaf in main_tree.traversal_vectorized(columns)])
+        self.assertEqual(
+            [leaf() for leaf in csv_tree.traversal_vectorized(columns)],
+            labels.tolist())
+
+        codes_values = [
+            leaf() for leaf in codes_tree.traversal_vectorized(columns)]
+
+        self.assertEqual(set(map(type, codes_values)), {int})
+        self.assertEqual(codes_values, codes.tolist())
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class forest_learner_Test(unittest.TestCase):
+    def test_case_1(self):
+        rng = np.random.default_rng(6)
+        features = rng.random((6000, 6))
+        labels = np.where(features[:, 0] + features[:, 1] > 1, "a", "b")
+        columns = {"x%d" % index : features[:, index] for index in range(6)}
+        forest = forest_learner(25, max_depth=8).fit(features, labels)
+
+        self.assertEqual(len(forest), 25)
+        self.assertEqual(forest.aggregate, "vote")
+        self.assertGreater((forest.predict(columns) == labels).mean(), 0.97)
+        self.assertEqual(
+            [main_tree.size() for main_tree in forest],
+            [main_tree.size() for main_tree in forest_learner(
+                25, max_depth=8, workers=2).fit(features, labels)])
+
+        targets = features[:, 2] * 4
+        forest = forest_learner(10, "variance", max_depth=8,
+                                max_features=None).fit(features, targets)
+
+        self.assertEqual(forest.aggregate, "mean")
+        self.assertLess(np.abs(forest.predict(columns) - targets).mean(),
+                        0.05)
+
+        with self.assertRaises(ValueError):
+            forest_learner(max_features="all")
+
+
+if __name__ == "__main__":
+    unittest.main()